@@ -8,6 +8,7 @@ upgraded and converted to KataSDK by:
 """
 import time
 import random
+from array import array
 import katagames_sdk as katasdk
 
 
@@ -25,108 +26,124 @@ clock = pygame.time.Clock()
 flames = screen = None
 
 
-class FlameParticle:
+class FlameGlow:
+    """glow atlas shared by the flames, built once by build(): (radius step, color band) -> (stamp, half size)"""
     alpha_layer_qty = 2
-    alpha_glow_difference_constant = 2
-
-    def __init__(self, x=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT // 2, r=5):
-        self.x = x
-        self.y = self.org_y = y
-        self.r = r
-        self.first_r = r
-        self.original_r = r
-        self.alpha_layers = FlameParticle.alpha_layer_qty
-        self.alpha_glow = FlameParticle.alpha_glow_difference_constant
-        max_surf_size = 2 * self.r * self.alpha_layers * self.alpha_layers * self.alpha_glow
-        self.surf = pygame.Surface((max_surf_size, max_surf_size))  # TODO fix (pygame.SRCALPHA makes sdk0.0.6 crash)
-        self.burn_rate = 0.028 + random.random()/3.14
-    
-    def update(self):
-        self.original_r -= self.burn_rate * self.first_r
-        self.r = int(self.original_r)
-        if self.r <= 0:
-            self.r = 1
-        
-        self.x += random.randint(-1, 1)
-        
-        # orange-like particle detection, see draw algorithm...
-        if (abs(self.org_y-self.y) < 29) and not(abs(self.org_y-self.y) < 14 and (self.original_r > 3.5)):
-            self.y -= 2
-        else:
-            self.y -= 3
-    
-    def draw(self):
-        max_surf_size = (self.original_r + 2 * 2 * 3.33) * 2
-        self.surf = pygame.Surface((max_surf_size, max_surf_size), pygame.SRCALPHA)  # TODO same problem as above
+    atlas = None
+    R_STEP = 0.25
+    MAX_R = 7.0  # particles are born with r < 7 and only shrink
+    BAND_COLORS = (
+        (255, 35, 0),  # red, pretty much
+        (255, 129, 0),  # orange
+        (255, 180, 0),  # yellow
+        (88, 88, 88)
+    )
+
+    @classmethod
+    def build(cls):
         retrait = {
             2: 245,
             1: 175,
             0: 144
         }
-        
-        for i in range(self.alpha_layers, -1, -1):
-            alpha = 255 - retrait[i]
-            if alpha <= 0:
-                alpha = 0
-            xx = self.original_r + i * i * 3.33
-            if xx > 25:
-                radius = 20  # cap size
-            else:
-                radius = int(xx*0.8)
-
-            # color attribution
-            if abs(self.org_y-self.y) < 29:
-                if abs(self.org_y-self.y) < 14 and (self.original_r > 3.5):
-                    r, g, b = 255, 35, 0  # red, pretty much
-                else:
-                    r, g, b = 255, 129, 0  # orange
-            elif (abs(self.org_y-self.y) < 50) or (self.original_r > 1.8):
-                r, g, b = 255, 180, 0  # yellow
-            else:
-                r, g, b = (88, 88, 88)
-            color = (r, g, b, alpha)
-            pygame.draw.circle(self.surf, color, (self.surf.get_width() // 2, self.surf.get_height() // 2), radius)
-        
-        screen.blit(self.surf, self.surf.get_rect(center=(self.x, self.y)))
+        cls.atlas = dict()
+        for k in range(int(cls.MAX_R / cls.R_STEP) + 1):
+            original_r = k * cls.R_STEP
+            max_surf_size = (original_r + 2 * 2 * 3.33) * 2
+            for band, (r, g, b) in enumerate(cls.BAND_COLORS):
+                surf = pygame.Surface((max_surf_size, max_surf_size), pygame.SRCALPHA)
+                for i in range(cls.alpha_layer_qty, -1, -1):
+                    alpha = max(0, 255 - retrait[i])
+                    xx = original_r + i * i * 3.33
+                    if xx > 25:
+                        radius = 20  # cap size
+                    else:
+                        radius = int(xx*0.8)
+                    pygame.draw.circle(surf, (r, g, b, alpha), (surf.get_width() // 2, surf.get_height() // 2), radius)
+                cls.atlas[k, band] = (surf, (surf.get_width() // 2, surf.get_height() // 2))
+
+    @staticmethod
+    def band(dy, original_r):
+        """color attribution: index in BAND_COLORS, dy being the height above the birth point"""
+        if dy < 29:
+            if dy < 14 and (original_r > 3.5):
+                return 0
+            return 1
+        elif (dy < 50) or (original_r > 1.8):
+            return 2
+        return 3
+
+    @classmethod
+    def get(cls, original_r, band):
+        """atlas entry for the given radius: (stamp, half size)"""
+        k = min(max(0, round(original_r / cls.R_STEP)), len(cls.atlas) // len(cls.BAND_COLORS) - 1)
+        return cls.atlas[k, band]
 
 
 class Flame:
+    """
+    Particle emitter, the particle state lives in parallel arrays indexed like particles:
+    x, y, org_y, original_r, first_r, burn_rate. Burnt-out particles are respawned in place
+    """
+
     def __init__(self, x=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT // 2, anim_speed=15):
         self.x = x
         self.y = y
         self.flame_intensity = 2
-        self.flame_particles = []
-        for i in range(self.flame_intensity * 25):
-            self.flame_particles.append(
-                FlameParticle(self.x + random.randint(-4, 4), self.y, 4+random.random()*3)
-            )
-            
+        n = self.flame_intensity * 25
+        self.xs = array('i', bytes(4 * n))
+        self.ys = array('i', bytes(4 * n))
+        self.org_ys = array('i', bytes(4 * n))
+        self.original_rs = array('d', bytes(8 * n))
+        self.first_rs = array('d', bytes(8 * n))
+        self.burn_rates = array('d', bytes(8 * n))
+        for i in range(n):
+            self._spawn(i)
+
         self.move_dt_threshold = 1.0/ anim_speed
         self.stacked_dur = 0.0
-        self._cache = list()
-    
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _spawn(self, i):
+        self.xs[i] = self.x + random.randint(-4, 4)
+        self.ys[i] = self.org_ys[i] = self.y
+        self.original_rs[i] = self.first_rs[i] = 4 + random.random()*3
+        self.burn_rates[i] = 0.028 + random.random()/3.14
+
     def update_flame(self, dt):
         self.stacked_dur += dt
         if self.stacked_dur > self.move_dt_threshold:
             self.stacked_dur = 0.0
-            # animate by modifying particles
-            del self._cache[:]
-            for part_obj in self.flame_particles:
-                part_obj.update()
-                if part_obj.original_r > 0:
-                    self._cache.append(part_obj)
+            # animate by modifying particles: burn, jitter, then rise slower in the orange zone
+            xs, ys, org_ys, rs = self.xs, self.ys, self.org_ys, self.original_rs
+            first_rs, burn_rates = self.first_rs, self.burn_rates
+            jitter = random.choices((-1, 0, 1), k=len(xs))
+            dead = list()
+            for i in range(len(xs)):
+                r = rs[i] = rs[i] - burn_rates[i] * first_rs[i]
+                xs[i] += jitter[i]
+                dy = abs(org_ys[i] - ys[i])
+                if dy < 29 and not (dy < 14 and r > 3.5):
+                    ys[i] -= 2
                 else:
-                    self._cache.append(
-                        FlameParticle(self.x + random.randint(-4, 4), self.y, 4+random.random()*3)
-                    )
-            # swap variable content
-            tmp = self._cache
-            self._cache = self.flame_particles
-            self.flame_particles = tmp
-    
+                    ys[i] -= 3
+                if r <= 0:
+                    dead.append(i)
+            for i in dead:
+                self._spawn(i)
+
+    def stamps(self, out):
+        """appends a (surface, topleft) pair per particle to out, for a blits() call"""
+        glow_band, glow = FlameGlow.band, FlameGlow.get
+        for x, y, org_y, r in zip(self.xs, self.ys, self.org_ys, self.original_rs):
+            surf, (hw, hh) = glow(r, glow_band(abs(org_y - y), r))
+            out.append((surf, (x - hw, y - hh)))
+        return out
+
     def draw_flame(self):
-        for i in self.flame_particles:
-            i.draw()
+        screen.blits(self.stamps(list()), False)
 
 
 class EvChecker(kataen.EventReceiver):
@@ -143,8 +160,10 @@ class EvChecker(kataen.EventReceiver):
                 self.last_t = ev.curr_t
         elif ev.type == EngineEvTypes.PAINT:
             ev.screen.fill(BGCOLOR)
+            seq = list()
             for f in flames:
-                f.draw_flame()
+                f.stamps(seq)
+            ev.screen.blits(seq, False)
         elif ev.type == pygame.QUIT:
             self.pev(kataen.EngineEvTypes.GAMEENDS)
         elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_SPACE:
@@ -160,6 +179,7 @@ def run_game():
     global flames, screen
     kataen.init(kataen.OLD_SCHOOL_MODE)
     screen = kataen.get_screen()
+    FlameGlow.build()
     flames = [
         Flame(x=SCREEN_WIDTH//2, y=Y_FIRE_POS, anim_speed=ANIM_SPEED),
         Flame(x=15+SCREEN_WIDTH//2, y=Y_FIRE_POS, anim_speed=ANIM_SPEED),
@@ -1,11 +1,14 @@
 
 import math
-from math import cos, pi, sin
+from array import array
+from colorsys import hsv_to_rgb
+from math import cos, exp, pi, sin
 from random import choice, gauss, randint, random, uniform
 from time import time
 from typing import Callable, Generic, Tuple, TypeVar, Union
 import time
 import collections
+import re
 
 
 """
@@ -125,6 +128,15 @@ P = TypeVar("P", bound="Particle")
 radians = pi / 180
 DEFAULT_FONT = None
 frame = 0
+STAMP_ANGLE_STEP = 10  # rotation precision of polygon stamps, in degrees
+
+# shapes & built-in animations understood by ParticleArrays (and StampRenderer for shapes)
+SOA_DISC, SOA_RING, SOA_SQUARE = 1, 2, 3
+SOA_FADE, SOA_SHRINK, SOA_BOUNCE_SIZE, SOA_GRADIENT = 1, 2, 4, 8
+
+# animation closures shared by all particles built with the same parameters
+ANIM_CACHE_SIZE = 1024
+_anim_cache = dict()
 
 
 def clamp(x, mini=0.0, maxi=1.0):
@@ -157,30 +169,416 @@ def rand2d(vec):
     return (uniform(0, vec[0]), uniform(0, vec[1]))
 
 
+def share_anim(key, anim):
+    if len(_anim_cache) >= ANIM_CACHE_SIZE:
+        _anim_cache.clear()
+    _anim_cache[key] = anim
+    return anim
+
+
+_rgba_cache = dict()
+
+
+def rgba(color):
+    """RGBA tuple of any pygame color argument, memoized for hashable ones."""
+    try:
+        return _rgba_cache[color]
+    except KeyError:
+        res = _rgba_cache[color] = tuple(pygame.Color(color or 0))
+        return res
+    except TypeError:
+        return tuple(pygame.Color(color or 0))
+
+
+class ParticleArrays:
+    """
+    Structure-of-arrays storage for plain CircleParticle/SquareParticle objects.
+
+    Every attribute lives in its own contiguous array, live particles always
+    occupy the slots [0, count) and a dead particle is replaced by the last
+    live one, so logic() walks the arrays in a single pass without any
+    per-particle method call or animation closure.
+    """
+
+    FLOAT_FIELDS = (
+        'x', 'y', 'speed', 'angle', 'acc', 'angle_vel', 'cfx', 'cfy',
+        'size', 'init_size', 'life_prop', 'life_step', 'fade_start',
+        'bounce_f', 'bounce_k', 'h0', 's0', 'v0', 'h1', 's1', 'v1',
+    )
+    BYTE_FIELDS = ('shape', 'anims', 'red', 'green', 'blue', 'alpha')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        for name in self.FLOAT_FIELDS:
+            setattr(self, name, array('d', bytes(8 * capacity)))
+        for name in self.BYTE_FIELDS:
+            setattr(self, name, array('B', bytes(capacity)))
+        self._columns = [getattr(self, name) for name in self.FLOAT_FIELDS + self.BYTE_FIELDS]
+
+    def push(self, particle) -> bool:
+        """
+        Copy a built particle into the next free slot.
+
+        Returns False when the particle cannot be handled here (full storage,
+        other particle type, custom animation), the caller keeps the object then.
+        """
+        if self.count >= self.capacity:
+            return False
+
+        kind = type(particle)
+        if kind is SquareParticle:
+            shape = SOA_SQUARE
+        elif kind is CircleParticle:
+            shape = SOA_DISC if particle.filled else SOA_RING
+        else:
+            return False
+
+        anims = 0
+        params = dict()
+        for anim in particle.animations:
+            tag = getattr(anim, 'soa_anim', None)
+            if tag is None:
+                return False
+            flag, args = tag
+            if flag & (SOA_SHRINK | SOA_BOUNCE_SIZE):
+                # both set the size, only the last one matters
+                anims &= ~(SOA_SHRINK | SOA_BOUNCE_SIZE)
+            elif flag == SOA_GRADIENT and anims & SOA_FADE:
+                # the gradient would reset the alpha set by the fade
+                return False
+            anims |= flag
+            params[flag] = args
+
+        i = self.count
+        self.count += 1
+        self.shape[i] = shape
+        self.anims[i] = anims
+        self.x[i], self.y[i] = particle.pos
+        self.cfx[i], self.cfy[i] = particle.constant_force
+        self.speed[i] = particle.speed
+        self.angle[i] = particle.angle
+        self.acc[i] = particle.acc
+        self.angle_vel[i] = particle.angle_vel
+        self.size[i] = particle.size
+        self.life_prop[i] = particle.life_prop
+        self.life_step[i] = 1 / particle.lifespan
+        self.red[i], self.green[i], self.blue[i], self.alpha[i] = particle.color
+
+        self.init_size[i] = particle.initial_size
+        if SOA_FADE in params:
+            self.fade_start[i], = params[SOA_FADE]
+        if anims & SOA_BOUNCE_SIZE:
+            self.bounce_f[i], self.bounce_k[i] = params[SOA_BOUNCE_SIZE]
+        if SOA_GRADIENT in params:
+            (self.h0[i], self.s0[i], self.v0[i],
+             self.h1[i], self.s1[i], self.v1[i]) = params[SOA_GRADIENT]
+        return True
+
+    def remove_slot(self, i: int):
+        """Free the slot i by moving the last live particle into it."""
+        last = self.count - 1
+        if i != last:
+            for col in self._columns:
+                col[i] = col[last]
+        self.count = last
+
+    def logic(self):
+        """Same update as Particle.logic + built-in animations, for all slots at once."""
+        x, y, speed, angle = self.x, self.y, self.speed, self.angle
+        acc, angle_vel, cfx, cfy = self.acc, self.angle_vel, self.cfx, self.cfy
+        size, init_size, life_prop, life_step = self.size, self.init_size, self.life_prop, self.life_step
+        anims, alpha = self.anims, self.alpha
+
+        dead = []
+        for i in range(self.count):
+            lp = life_prop[i] + life_step[i]
+            life_prop[i] = lp
+            sp = speed[i] + acc[i]
+            speed[i] = sp
+            an = angle[i] + angle_vel[i]
+            angle[i] = an
+            x[i] += cos(an * radians) * sp + cfx[i]
+            y[i] += sin(an * radians) * sp + cfy[i]
+
+            if sp < 0 or size[i] <= 0 or lp >= 1:
+                dead.append(i)
+                continue
+
+            flags = anims[i]
+            if not flags:
+                continue
+            if flags & SOA_SHRINK:
+                size[i] = init_size[i] * (1 - lp)
+            elif flags & SOA_BOUNCE_SIZE:
+                size[i] = bounce(lp, self.bounce_f[i], self.bounce_k[i]) * init_size[i]
+            if flags & SOA_GRADIENT:
+                self._gradient(i, lp)
+            if flags & SOA_FADE:
+                fs = self.fade_start[i]
+                if lp >= fs:
+                    alpha[i] = int(255 * (1 - (lp - fs) / (1 - fs)))
+
+        # descending order, so the last slot is always a live particle
+        for i in reversed(dead):
+            self.remove_slot(i)
+
+    def _gradient(self, i, t):
+        p = 1 - t
+        h = int(p * self.h0[i] + t * self.h1[i]) % 360
+        s = clamp(int(100 * (p * self.s0[i] + t * self.s1[i])), 0, 100)
+        v = clamp(int(100 * (p * self.v0[i] + t * self.v1[i])), 0, 100)
+        r, g, b = hsv_to_rgb(h / 360, s / 100, v / 100)
+        self.red[i], self.green[i], self.blue[i] = round(255 * r), round(255 * g), round(255 * b)
+        self.alpha[i] = 255
+
+    def draw(self, surf):
+        x, y, size, shape = self.x, self.y, self.size, self.shape
+        red, green, blue, alpha = self.red, self.green, self.blue, self.alpha
+
+        for i in range(self.count):
+            a = alpha[i]
+            color = (red[i], green[i], blue[i], a)
+            s = size[i]
+            if shape[i] == SOA_SQUARE:
+                rect = (x[i] - s / 2, y[i] - s / 2, s, s)
+                if a < 255:
+                    gfxd.box(surf, rect, color)
+                else:
+                    pygame.draw.rect(surf, color, rect)
+            elif a < 255:
+                circle = gfxd.filled_circle if shape[i] == SOA_DISC else gfxd.circle
+                circle(surf, int(x[i]), int(y[i]), int(s), color)
+            else:
+                pygame.draw.circle(surf, color, (x[i], y[i]), s, 0 if shape[i] == SOA_DISC else 1)
+
+
+class ParticlePool:
+    """
+    Free lists of dead particles, one per particle class.
+
+    ParticleSystem.new() pops a dead particle and resets it in place instead of
+    allocating a new Particle, Builder, Color, Vector2 and animation closures.
+    At most `capacity` dead particles are kept around.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.free = 0
+        self.peak = 0  # high-water mark of live particles
+        self.reused = 0  # allocations avoided during the current frame
+        self.reused_last_frame = 0
+        self._free_lists = collections.defaultdict(list)
+
+    def acquire(self, cls, *args):
+        free_list = self._free_lists.get(cls)
+        if not free_list:
+            return cls(*args)
+        self.free -= 1
+        self.reused += 1
+        particle = free_list.pop()
+        particle.reset(*args)
+        return particle
+
+    def release(self, particle):
+        if self.free < self.capacity:
+            self.free += 1
+            self._free_lists[type(particle)].append(particle)
+
+    def end_frame(self, live: int):
+        if live > self.peak:
+            self.peak = live
+        self.reused_last_frame = self.reused
+        self.reused = 0
+
+
+class StampRenderer:
+    """
+    Batched drawing of circle, square and polygon particles.
+
+    Particles are bucketed by (shape, size, color) with the color and alpha rounded
+    to the nearest multiple of a few bits' step (0 and 255 stay exact). Each bucket is
+    rasterized once on a stamp surface kept in an LRU cache, then the whole frame goes
+    through Surface.blits(), in particle order: particles that can't be stamped or blitted
+    flush the sequence and draw() themselves.
+    """
+
+    def __init__(self, max_stamps=512, color_bits=5, alpha_bits=4):
+        self.max_stamps = max_stamps
+        self._color_q = self._rounding_table(color_bits)
+        self._alpha_q = self._rounding_table(alpha_bits)
+        self._stamps = collections.OrderedDict()
+        self._blit_seq = []
+
+    @staticmethod
+    def _rounding_table(bits):
+        """channel value -> nearest multiple of the bucket step, capped to 255"""
+        step = 0x100 >> bits
+        return bytes(min(255, (v + step // 2) // step * step) for v in range(256))
+
+    def stamp(self, key):
+        """Cached (surface, half width) for the bucket key."""
+        stamps = self._stamps
+        entry = stamps.get(key)
+        if entry is None:
+            entry = stamps[key] = self._rasterize(*key)
+            if len(stamps) > self.max_stamps:
+                stamps.popitem(last=False)
+        else:
+            stamps.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _rasterize(shape, size, r, g, b, a):
+        color = (r, g, b, a)
+        if shape == SOA_SQUARE:
+            surf = pygame.Surface((size, size), pygame.SRCALPHA)
+            surf.fill(color)
+            return surf, size // 2
+
+        surf = pygame.Surface((2 * size + 1, 2 * size + 1), pygame.SRCALPHA)
+        if shape == SOA_DISC:
+            pygame.draw.circle(surf, color, (size, size), size)
+        elif shape == SOA_RING:
+            pygame.draw.circle(surf, color, (size, size), size, 1)
+        else:
+            _, vertices, vertex_step, rotation = shape
+            center = Vector2(size, size)
+            points = [
+                center + polar(size, rotation + i * 360 / vertices * vertex_step)
+                for i in range(vertices)
+            ]
+            pygame.draw.polygon(surf, color, points)
+        return surf, size
+
+    def draw(self, surf: pygame.Surface, particles, arrays=None):
+        color_q, alpha_q = self._color_q, self._alpha_q
+        stamp = self.stamp
+        seq = self._blit_seq
+        frame_stamps = dict()  # touch each LRU entry once per frame
+
+        if arrays is not None:
+            x, y, size, shape = arrays.x, arrays.y, arrays.size, arrays.shape
+            red, green, blue, alpha = arrays.red, arrays.green, arrays.blue, arrays.alpha
+            for i in range(arrays.count):
+                s = int(size[i] + 0.5)
+                if s <= 0 or not alpha[i]:
+                    continue
+                key = (shape[i], s, color_q[red[i]], color_q[green[i]], color_q[blue[i]], alpha_q[alpha[i]])
+                entry = frame_stamps.get(key)
+                if entry is None:
+                    entry = frame_stamps[key] = stamp(key)
+                img, half = entry
+                seq.append((img, (int(x[i]) - half, int(y[i]) - half)))
+
+        for particle in particles:
+            shape = particle.stamp_shape()
+            if shape is None:
+                entry = particle.blit_entry()
+                if entry is not None:
+                    seq.append(entry)
+                else:
+                    surf.blits(seq, False)
+                    seq.clear()
+                    particle.draw(surf)
+                continue
+            r, g, b, a = particle.color
+            s = int(particle.size + 0.5)
+            if s <= 0 or not a:
+                continue
+            key = (shape, s, color_q[r], color_q[g], color_q[b], alpha_q[a])
+            entry = frame_stamps.get(key)
+            if entry is None:
+                entry = frame_stamps[key] = stamp(key)
+            img, half = entry
+            pos = particle.pos
+            seq.append((img, (int(pos.x) - half, int(pos.y) - half)))
+
+        surf.blits(seq, False)
+        seq.clear()
+
+
 class ParticleSystem(set):
     fountains: "List[ParticleFountain]"
 
-    def __init__(self):
+    def __init__(self, soa_capacity=0, pool_capacity=0, max_stamps=0):
+        """
+        Args:
+            soa_capacity: when > 0, circle & square particles that only use built-in
+                animations are stored in a ParticleArrays of that capacity
+            pool_capacity: when > 0, dead particles are recycled through a ParticlePool
+                keeping at most that many of them
+            max_stamps: when > 0, particles are drawn in one batch by a StampRenderer
+                caching at most that many stamps
+        """
         super().__init__()
         self.fountains = []
+        self.arrays = ParticleArrays(soa_capacity) if soa_capacity else None
+        self.pool = ParticlePool(pool_capacity) if pool_capacity else None
+        self.renderer = StampRenderer(max_stamps) if max_stamps else None
+        self._dead = []
+
+    def __len__(self):
+        n = super().__len__()
+        if self.arrays is not None:
+            n += self.arrays.count
+        return n
+
+    def add(self, particle):
+        if self.arrays is None or not self.arrays.push(particle):
+            super().add(particle)
+        elif self.pool is not None:
+            # the object only carried the values copied in the arrays
+            self.pool.release(particle)
+
+    def new(self, cls, *args):
+        """Same as cls(*args), but recycles a dead particle when the system has a pool."""
+        if self.pool is None:
+            return cls(*args)
+        return self.pool.acquire(cls, *args)
+
+    def pool_stats(self) -> dict:
+        """Live, free and peak particle counts, and allocations avoided during the last frame."""
+        pool = self.pool
+        if pool is None:
+            return dict(live=len(self), free=0, peak=len(self), avoided=0)
+        return dict(live=len(self), free=pool.free, peak=pool.peak, avoided=pool.reused_last_frame)
 
     def logic(self):
         """Update all the particle for the frame."""
 
+        if self.pool is not None:
+            self.pool.end_frame(len(self))
+
         for fountain in self.fountains:
             fountain.logic(self)
 
-        dead = set()
+        if self.arrays is not None:
+            self.arrays.logic()
+
+        dead = self._dead
         for particle in self:
             particle.logic()
             if not particle.alive:
-                dead.add(particle)
+                dead.append(particle)
 
-        self.difference_update(dead)
+        if dead:
+            for particle in dead:
+                self.remove(particle)
+                if self.pool is not None:
+                    self.pool.release(particle)
+            dead.clear()
 
     def draw(self, surf: pygame.Surface):
         """Draw all the particles"""
 
+        if self.renderer is not None:
+            self.renderer.draw(surf, self, self.arrays)
+            return
+
+        if self.arrays is not None:
+            self.arrays.draw(surf)
+
         for particle in self:
             particle.draw(surf)
 
@@ -200,10 +598,17 @@ class ParticleSystem(set):
 
 class ParticleFountain:
     def __init__(
-            self, particle_generator: Callable[[], "Particle"], frequency=1.0,
+            self, particle_generator: Callable[[], "Particle"], frequency=1.0, prewarm_images=(),
     ):
+        """
+        Args:
+            prewarm_images: surfaces used by the generated ImageParticle, all their
+                sizes are scaled right away instead of during the first frames
+        """
         self.generator = particle_generator
         self.frequency = frequency
+        for image in prewarm_images:
+            IMAGE_CACHE.prewarm(image)
 
     def logic(self, system):
         for _ in rrange(self.frequency):
@@ -230,14 +635,23 @@ class ParticleFountain:
 class Particle:
     def __init__(self):
         self.pos = Vector2(0, 0)
+        self.constant_force = Vector2()
+        self.animations = []
+        self._builder = None
+        Particle.reset(self)
+
+    def reset(self):
+        """Restore the initial state, reusing the existing Vector2 and list objects."""
+        self.pos.x = self.pos.y = 0
 
         self.speed = 3.0
         self.angle = -90
         self.acc = 0.0
         self.angle_vel = 0.0
         self.size = 10.0
+        self.initial_size = self.size
         self.lifespan = 60
-        self.constant_force = Vector2()
+        self.constant_force.x = self.constant_force.y = 0
 
         self.inner_rotation = 0
         self.inner_rotation_speed = 0
@@ -245,7 +659,7 @@ class Particle:
 
         self.life_prop = 0.0
         self.alive = True
-        self.animations = []
+        self.animations.clear()
 
     # Builder methods
 
@@ -263,7 +677,7 @@ class Particle:
             Returns:
                 The particle being build.
             """
-            self._p.pos = Vector2(pos)
+            self._p.pos.x, self._p.pos.y = pos
             self._p.angle = angle
             return self
 
@@ -281,7 +695,7 @@ class Particle:
         def constant_force(self, velocity: Vector2):
             """Add the given velocity to the particle's postion every frame."""
 
-            self._p.constant_force = velocity
+            self._p.constant_force.x, self._p.constant_force.y = velocity
             return self
 
         def acceleration(self, directional: float):
@@ -310,72 +724,97 @@ class Particle:
             return self
 
         def anim_fade(self, fade_start=0):
-            def fade(particle):
-                if particle.life_prop < fade_start:
-                    return
-                t = (particle.life_prop - fade_start) / (1 - fade_start)
-                alpha = int(255 * (1 - t))
-                particle.alpha = alpha
-
+            key = ('fade', fade_start)
+            fade = _anim_cache.get(key)
+            if fade is None:
+                def fade(particle):
+                    if particle.life_prop < fade_start:
+                        return
+                    t = (particle.life_prop - fade_start) / (1 - fade_start)
+                    alpha = int(255 * (1 - t))
+                    particle.alpha = alpha
+
+                fade.soa_anim = (SOA_FADE, (fade_start,))
+                share_anim(key, fade)
             return self.anim(fade)
 
         def anim_blink(self, up_duration=0.5, pow=2):
-            def blink(particle):
-                if particle.life_prop < up_duration:
-                    a = particle.life_prop / up_duration
-                else:
-                    a = (1 - particle.life_prop) / (1 - up_duration)
-                # a = 1 - abs(1 - 2 * particle.life_prop)
-                particle.alpha = int(255 * a ** pow)
-
+            key = ('blink', up_duration, pow)
+            blink = _anim_cache.get(key)
+            if blink is None:
+                def blink(particle):
+                    if particle.life_prop < up_duration:
+                        a = particle.life_prop / up_duration
+                    else:
+                        a = (1 - particle.life_prop) / (1 - up_duration)
+                    # a = 1 - abs(1 - 2 * particle.life_prop)
+                    particle.alpha = int(255 * a ** pow)
+
+                share_anim(key, blink)
             return self.anim(blink)
 
         def anim_bounce_rect(self, rect):
             """Make the particle bounce inside of the rectangle."""
 
             rect = pygame.Rect(rect)
-
-            def bounce_rect(particle):
-                angle = particle.angle % 360
-                if particle.pos.x - particle.size < rect.left and 90 < angle < 270:
-                    particle.angle = 180 - angle
-                elif particle.pos.x + particle.size > rect.right and (
-                        angle < 90 or angle > 270
-                ):
-                    particle.angle = 180 - angle
-
-                angle = particle.angle % 360
-                if particle.pos.y - particle.size < rect.top and angle > 180:
-                    particle.angle = -angle
-                elif particle.pos.y + particle.size > rect.bottom and angle < 180:
-                    particle.angle = -angle
-
+            key = ('bounce_rect', tuple(rect))
+            bounce_rect = _anim_cache.get(key)
+            if bounce_rect is None:
+                def bounce_rect(particle):
+                    angle = particle.angle % 360
+                    if particle.pos.x - particle.size < rect.left and 90 < angle < 270:
+                        particle.angle = 180 - angle
+                    elif particle.pos.x + particle.size > rect.right and (
+                            angle < 90 or angle > 270
+                    ):
+                        particle.angle = 180 - angle
+
+                    angle = particle.angle % 360
+                    if particle.pos.y - particle.size < rect.top and angle > 180:
+                        particle.angle = -angle
+                    elif particle.pos.y + particle.size > rect.bottom and angle < 180:
+                        particle.angle = -angle
+
+                share_anim(key, bounce_rect)
             return self.anim(bounce_rect)
 
-        def anim_shrink(self):
-            initial_size = self._p.size
-
-            def shrink(particle):
-                particle.size = initial_size * (1 - particle.life_prop)
+        # the size animations below scale particle.initial_size,
+        # i.e. the size of the particle when they are added
 
+        def anim_shrink(self):
+            self._p.initial_size = self._p.size
+            shrink = _anim_cache.get('shrink')
+            if shrink is None:
+                def shrink(particle):
+                    particle.size = particle.initial_size * (1 - particle.life_prop)
+
+                shrink.soa_anim = (SOA_SHRINK, ())
+                share_anim('shrink', shrink)
             return self.anim(shrink)
 
         def anim_bounce_size(self, increase_duration=0.3, k=10):
-            initial_size = self._p.size
-
-            def bounce_size(particle):
-                particle.size = (
-                        bounce(particle.life_prop, increase_duration, k) * initial_size
-                )
-
+            self._p.initial_size = self._p.size
+            key = ('bounce_size', increase_duration, k)
+            bounce_size = _anim_cache.get(key)
+            if bounce_size is None:
+                def bounce_size(particle):
+                    particle.size = (
+                            bounce(particle.life_prop, increase_duration, k) * particle.initial_size
+                    )
+
+                bounce_size.soa_anim = (SOA_BOUNCE_SIZE, (increase_duration, k))
+                share_anim(key, bounce_size)
             return self.anim(bounce_size)
 
         def anim_bounce_size_and_shrink(self, stretch=5):
-            initial_size = self._p.size
-
-            def bounce_size_and_shrink(particle):
-                particle.size = exp_impulse(particle.life_prop, stretch) * initial_size
-
+            self._p.initial_size = self._p.size
+            key = ('bounce_size_and_shrink', stretch)
+            bounce_size_and_shrink = _anim_cache.get(key)
+            if bounce_size_and_shrink is None:
+                def bounce_size_and_shrink(particle):
+                    particle.size = exp_impulse(particle.life_prop, stretch) * particle.initial_size
+
+                share_anim(key, bounce_size_and_shrink)
             return self.anim(bounce_size_and_shrink)
 
         def apply(self, func):
@@ -387,7 +826,9 @@ class Particle:
             return self._p
 
     def builder(self):
-        return self.Builder(self)
+        if self._builder is None:
+            self._builder = self.Builder(self)
+        return self._builder
 
     # Actual methods
 
@@ -414,12 +855,27 @@ class Particle:
     def draw(self, surf):
         raise NotImplementedError()
 
+    def stamp_shape(self):
+        """
+        Shape key used by StampRenderer, or None when the particle has to draw() itself.
+        Subclasses overriding draw() should override this as well.
+        """
+        return None
+
+    def blit_entry(self):
+        """(surface, topleft) for StampRenderer's blits() when stamp_shape() is None, or None to draw()"""
+        return None
+
 
 class DrawnParticle(Particle):
     def __init__(self, color=None):
         self.color = pygame.Color(color or 0)
         super().__init__()
 
+    def reset(self, color=None):
+        super().reset()
+        self.color.r, self.color.g, self.color.b, self.color.a = rgba(color)
+
     @property
     def alpha(self):
         return self.color.a
@@ -447,21 +903,28 @@ class DrawnParticle(Particle):
             # s1 = clamp(s) * 100 if s is not None else s0
             # v1 = clamp(v) * 100 if v is not None else v0
 
-            def gradient_to(particle):
-                p = 1 - particle.life_prop
-                t = particle.life_prop
-
-                h = int(p * h0 + t * h1) % 360
-                s = int(100 * (p * s0 + t * s1))
-                v = int(100 * (p * v0 + t * v1))
-                r = h, s, v, 100
-                particle.color.hsva = r
-
+            key = ('gradient_to', h0, s0, v0, h1, v1, s1)
+            gradient_to = _anim_cache.get(key)
+            if gradient_to is None:
+                def gradient_to(particle):
+                    p = 1 - particle.life_prop
+                    t = particle.life_prop
+
+                    h = int(p * h0 + t * h1) % 360
+                    s = int(100 * (p * s0 + t * s1))
+                    v = int(100 * (p * v0 + t * v1))
+                    r = h, s, v, 100
+                    particle.color.hsva = r
+
+                gradient_to.soa_anim = (SOA_GRADIENT, (h0, s0, v0, h1, s1, v1))
+                share_anim(key, gradient_to)
             return self.anim(gradient_to)
 
     def builder(self):
         # the method is here only for type hinting
-        return self.Builder(self)
+        if self._builder is None:
+            self._builder = self.Builder(self)
+        return self._builder
 
 
 class CircleParticle(DrawnParticle):
@@ -469,6 +932,10 @@ class CircleParticle(DrawnParticle):
         super().__init__(color)
         self.filled = filled
 
+    def reset(self, color=None, filled=True):
+        super().reset(color)
+        self.filled = filled
+
     def draw(self, surf):
         if self.color.a < 255:
             if self.filled:
@@ -482,6 +949,9 @@ class CircleParticle(DrawnParticle):
         else:
             pygame.draw.circle(surf, self.color, self.pos, self.size, 1 - self.filled)
 
+    def stamp_shape(self):
+        return SOA_DISC if self.filled else SOA_RING
+
 
 class SquareParticle(DrawnParticle):
     def draw(self, surf):
@@ -491,6 +961,9 @@ class SquareParticle(DrawnParticle):
         else:
             pygame.draw.rect(surf, self.color, (pos, (self.size, self.size)))
 
+    def stamp_shape(self):
+        return SOA_SQUARE
+
 
 class PolygonParticle(DrawnParticle):
     def __init__(self, vertices: int, color=None, vertex_step: int = 1):
@@ -510,6 +983,11 @@ class PolygonParticle(DrawnParticle):
         self.vertex_step = vertex_step
         self.vertices = vertices
 
+    def reset(self, vertices: int, color=None, vertex_step: int = 1):
+        super().reset(color)
+        self.vertex_step = vertex_step
+        self.vertices = vertices
+
     def draw(self, surf):
         points = [
             self.pos
@@ -522,6 +1000,11 @@ class PolygonParticle(DrawnParticle):
 
         gfxd.filled_polygon(surf, points, self.color)
 
+    def stamp_shape(self):
+        # a regular polygon looks the same every 360 / vertices degrees
+        rotation = STAMP_ANGLE_STEP * round(self.inner_rotation / STAMP_ANGLE_STEP)
+        return 'polygon', self.vertices, self.vertex_step, rotation % (360 / self.vertices)
+
 
 class ShardParticle(DrawnParticle):
     def __init__(self, color=None, head=1, tail=3):
@@ -536,6 +1019,11 @@ class ShardParticle(DrawnParticle):
         self.tail = tail
         self.head = head
 
+    def reset(self, color=None, head=1, tail=3):
+        super().reset(color)
+        self.tail = tail
+        self.head = head
+
     def draw(self, surf):
         vel = polar(self.speed, self.angle)
         vel.scale_to_length(self.size)
@@ -557,48 +1045,102 @@ class LineParticle(DrawnParticle):
         self.width = width
         super().__init__(color)
 
+    def reset(self, length, color=None, width=1):
+        super().reset(color)
+        self.length = length
+        self.width = width
+
     def draw(self, surf):
         end = vec2int(self.pos - polar(self.length, self.angle))
         start = vec2int(self.pos)
         gfxd.line(surf, *start, *end, self.color)
 
 
+class ScaledImageCache:
+    """
+    Scaled copies of particle images, shared by all ImageParticle instances.
+
+    Entries are keyed by (source surface, integer size, alpha bucket) and the
+    least recently used one is dropped once max_entries is reached, so the
+    scaling cost is paid once per size instead of once per particle.
+    """
+
+    def __init__(self, max_entries=2048, alpha_bits=4):
+        self.max_entries = max_entries
+        self._alpha_low = 0xFF >> alpha_bits
+        self._entries = collections.OrderedDict()
+
+    def alpha_bucket(self, alpha: int) -> int:
+        """nearest multiple of the bucket step, clamped to 0..255 (same rounding as StampRenderer)"""
+        step = self._alpha_low + 1
+        return min(255, max(0, (int(alpha) + step // 2) // step * step))
+
+    def get(self, original: pygame.Surface, size: int, alpha: int = 255) -> pygame.Surface:
+        key = (original, size, self.alpha_bucket(alpha))
+        entries = self._entries
+        surf = entries.get(key)
+        if surf is not None:
+            entries.move_to_end(key)
+            return surf
+
+        w, h = original.get_size()
+        ratio = size / min(w, h)
+        surf = pygame.transform.scale(original, vec2int((w * ratio, h * ratio)))
+        surf.set_alpha(key[2])
+
+        entries[key] = surf
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return surf
+
+    def prewarm(self, original: pygame.Surface, alphas=None):
+        """Scale the image to every integer size up to its own, for each given alpha (default: every bucket)."""
+        if alphas is None:
+            alphas = list(range(0, 256, self._alpha_low + 1)) + [255]
+        for size in range(1, min(original.get_size()) + 1):
+            for alpha in alphas:
+                self.get(original, size, alpha)
+
+
 class ImageParticle(Particle):
     def __init__(self, surf: pygame.Surface):
         self._alpha = 255
         self.original_surf = surf
         self.need_redraw = True
-        self.surf = pygame.Surface((1, 1))
+        self.surf = None
 
         super().__init__()
 
         self.size = min(self.original_surf.get_size())
 
+    def reset(self, surf: pygame.Surface):
+        self.original_surf = surf
+        self.need_redraw = True
+        super().reset()
+        self.size = min(self.original_surf.get_size())
+
     @property
     def alpha(self):
         return self._alpha
 
     @alpha.setter
     def alpha(self, value: int):
+        # scaled surfaces are shared, so a new alpha means picking another one
+        if IMAGE_CACHE.alpha_bucket(value) != IMAGE_CACHE.alpha_bucket(self._alpha):
+            self.need_redraw = True
         self._alpha = value
-        self.surf.set_alpha(value)
 
     def redraw(self):
         self.need_redraw = False
-        w, h = self.original_surf.get_size()
-        ratio = self.size / min(w, h)
-        surf = pygame.transform.scale(
-            self.original_surf, vec2int((w * ratio, h * ratio))
-        )
-
-        surf.set_alpha(self.alpha)
-        return surf
+        return IMAGE_CACHE.get(self.original_surf, int(self.size), self._alpha)
 
     def draw(self, surf: pygame.Surface):
+        surf.blit(*self.blit_entry())
+
+    def blit_entry(self):
         if self.need_redraw:
             self.surf = self.redraw()
-
-        surf.blit(self.surf, self.surf.get_rect(center=self.pos))
+        return self.surf, self.surf.get_rect(center=self.pos).topleft
 
     def logic(self):
         last_size = self.size
@@ -607,10 +1149,14 @@ class ImageParticle(Particle):
             self.need_redraw = True
 
 
+IMAGE_CACHE = ScaledImageCache()
+
+
 class UniqueRecv(kataen.EventReceiver):
     def __init__(self):
         super().__init__()
         self.do_logic = True
+        self.img_fountain = None
         
     def proc_event(self, ev, source):
         global frame, particles, gctrl, DEFAULT_FONT, SCR_SIZE
@@ -629,13 +1175,46 @@ class UniqueRecv(kataen.EventReceiver):
                 self.pev(kataen.EngineEvTypes.GAMEENDS)
             elif key == pygame.K_SPACE:
                 self.do_logic = not self.do_logic
+            elif key == pygame.K_i:
+                # toggles a fountain of text images, all their scaled copies are prewarmed
+                if self.img_fountain is None:
+                    surfs = [DEFAULT_FONT.render(text, True, "navyblue") for text in ("Hello", "Bonjour", "Hola")]
+                    self.img_fountain = ParticleFountain(
+                        lambda: particles.new(ImageParticle, choice(surfs)).builder()
+                        .at((SCR_SIZE[0] // 2, SCR_SIZE[1] // 2), gauss(270, 20))
+                        .velocity(gauss(3, 0.5))
+                        .living(90)
+                        .anim_fade()
+                        .build(),
+                        0.1,
+                        prewarm_images=surfs,
+                    )
+                if self.img_fountain in particles.fountains:
+                    particles.fountains.remove(self.img_fountain)
+                else:
+                    particles.fountains.append(self.img_fountain)
+            elif key == pygame.K_b:
+                # stress test for the array-backed storage
+                for _ in range(4096):
+                    rd_angle = uniform(0, 360)
+                    particles.add(
+                        particles.new(SquareParticle).builder()
+                        .at((SCR_SIZE[0] // 2, SCR_SIZE[1] // 2), rd_angle)
+                        .velocity(gauss(2, 0.5))
+                        .sized(uniform(1, 4))
+                        .living(randint(60, 180))
+                        .hsv(rd_angle)
+                        .anim_shrink()
+                        .anim_fade()
+                        .build()
+                    )
 
         if ev.type == pygame.MOUSEBUTTONDOWN:
             for _ in range(64):
                 rd_angle = uniform(0, 360)
                 x,y = kataen.proj_to_vscreen(ev.pos)
                 # /!\ need to take care of upscaling x2
-                p = CircleParticle().builder() \
+                p = particles.new(CircleParticle).builder() \
                     .at((x,y), rd_angle) \
                     .velocity(gauss(3, 0.33)) \
                     .hsv(rd_angle) \
@@ -646,21 +1225,78 @@ class UniqueRecv(kataen.EventReceiver):
                 particles.add(p)
 
 
+class TextCache:
+    """
+    Rendered text surfaces, keyed by (text, size, color, bg_color, antialias), the least
+    recently used one is dropped past max_entries. Fonts are kept per size.
+    With digit_runs, a line is drawn as separate digit/non-digit runs so a changing
+    number only renders the digits not seen yet.
+    """
+    DIGIT_RUNS = re.compile(r'\d|\D+')
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._fonts = dict()
+        self._entries = collections.OrderedDict()
+
+    def font(self, size):
+        f = self._fonts.get(size)
+        if f is None:
+            f = self._fonts[size] = pygame.font.Font(None, size)
+        return f
+
+    @staticmethod
+    def _color_key(c):
+        return c if c is None or isinstance(c, tuple) else tuple(pygame.Color(c))
+
+    def get(self, text, size, color, bg_color=None, antialias=True):
+        key = (text, size, self._color_key(color), self._color_key(bg_color), antialias)
+        entries = self._entries
+        surf = entries.get(key)
+        if surf is not None:
+            entries.move_to_end(key)
+            return surf
+        surf = entries[key] = self.font(size).render(text, antialias, color, bg_color)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return surf
+
+    def blit_line(self, screen, text, size, pos, color, bg_color=None, antialias=True, digit_runs=False) -> int:
+        """returns the line height"""
+        runs = self.DIGIT_RUNS.findall(text) if digit_runs else None
+        if not runs:
+            surf = self.get(text, size, color, bg_color, antialias)
+            screen.blit(surf, pos)
+            return surf.get_height()
+        x, y = pos
+        h = 0
+        for r in runs:
+            surf = self.get(r, size, color, bg_color, antialias)
+            screen.blit(surf, (x, y))
+            x += surf.get_width()
+            h = max(h, surf.get_height())
+        return h
+
+
 class Game:
     """
     Base class (helper)
     for writing a pygame game that can
     ALSO run in the web context
     """
-    def __init__(self, track_fps=True):
+    def __init__(self, track_fps=True, fixed_dt=None, max_steps=5):
+        """fixed_dt (secs) turns on the fixed-timestep mode: update() always gets fixed_dt,
+        at most max_steps times per LOGICUPDATE, and render() gets an extra interpolation alpha"""
         self._fps_n_frames = 16 if track_fps else 0
+        self._fixed_dt = fixed_dt
+        self._max_steps = max_steps
+        self._accumulator = 0.0
         
         self._fps_tracker_logic = collections.deque()
         self._fps_tracker_rendering = collections.deque()
         self._tick = 0
 
-        self._cached_info_text = None
-        self._info_font = None
+        self._cached_info_text = TextCache()
 
         self._li_recv = list()
         self._manager = None
@@ -718,20 +1354,17 @@ class Game:
         pass
 
     def render(self, screen):
+        """in fixed-timestep mode, called as render(screen, alpha) with alpha in [0, 1)"""
         raise NotImplementedError()
 
     def update(self, events, dt):
         raise NotImplementedError()
 
-    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None):
-        if self._info_font is None or self._info_font.get_height() != size:
-            self._info_font = pygame.font.Font(None, size)
-        lines = text.split("\n")
+    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None,
+                    antialias=True, digit_runs=False):
         y = pos[1]
-        for l in lines:
-            surf = self._info_font.render(l, True, color, bg_color)
-            screen.blit(surf, (pos[0], y))
-            y += surf.get_height()
+        for l in text.split("\n"):
+            y += self._cached_info_text.blit_line(screen, l, size, (pos[0], y), color, bg_color, antialias, digit_runs)
 
     def get_fps(self, logical=True) -> float:
         q = self._fps_tracker_logic if logical else self._fps_tracker_rendering
@@ -750,7 +1383,10 @@ class Game:
             self._fps_tracker_rendering.append(time.time())
             if len(self._fps_tracker_rendering) > self._fps_n_frames:
                 self._fps_tracker_rendering.popleft()
-        self.render(screen)
+        if self._fixed_dt is None:
+            self.render(screen)
+        else:
+            self.render(screen, self._accumulator / self._fixed_dt)
 
     def _update_internal(self, events, dt):
         if self._fps_n_frames > 0:
@@ -760,6 +1396,22 @@ class Game:
         self.update(events, dt)
         self._tick += 1
 
+    def _advance(self, events, dt) -> int:
+        """runs the logic steps for dt elapsed secs, returns how many were run"""
+        if self._fixed_dt is None:
+            self._update_internal(events, dt)
+            return 1
+        self._accumulator += dt
+        steps = 0
+        while self._accumulator >= self._fixed_dt:
+            if steps == self._max_steps:  # too late to catch up, drop the backlog
+                self._accumulator %= self._fixed_dt
+                break
+            self._update_internal(events if steps == 0 else [], self._fixed_dt)
+            self._accumulator -= self._fixed_dt
+            steps += 1
+        return steps
+
     def _get_mode_internal(self):
         mode_str = self.get_mode().upper()
         if mode_str == 'HD':
@@ -783,9 +1435,9 @@ class Game:
                 self._game._render_internal(ev.screen)
             elif ev.type == EngineEvTypes.LOGICUPDATE:
                 cur_time = ev.curr_t
-                self._game._update_internal(self._event_queue, cur_time - self._last_update_time)
+                if self._game._advance(self._event_queue, cur_time - self._last_update_time):
+                    self._event_queue.clear()  # else keep the input for the next step
                 self._last_update_time = cur_time
-                self._event_queue.clear()
             else:
                 self._event_queue.append(ev)
 
@@ -805,7 +1457,7 @@ class ParticleSystemTester(Game):
         SCR_SIZE = (960//2,540//2)  # TODO can we retrieve this from kataen
         # but before init?
 
-        particles = ParticleSystem()
+        particles = ParticleSystem(soa_capacity=100000, pool_capacity=4096, max_stamps=512)
         DEFAULT_FONT = pygame.font.Font(None, 42)
         
         def base(y):
@@ -816,9 +1468,10 @@ class ParticleSystemTester(Game):
                 .living(64)
                 .anim_fade()
             )
+        base32 = base(32)
         particles.fountains = [
             ParticleFountain(
-                lambda: PolygonParticle(3, "navyblue").builder().apply(base(32)).build(),  # SquareParticle("#00a590")
+                lambda: particles.new(PolygonParticle, 3, "navyblue").builder().apply(base32).build(),  # SquareParticle("#00a590")
                 1,
             ),
         ]
@@ -841,6 +1494,8 @@ class ParticleSystemTester(Game):
 
         print('- - - Mouse click will add more particles! - - -')
         print('- - - SPACE key will pause the simulation - - -')
+        print('- - - B key will spawn 4096 particles at once - - -')
+        print('- - - I key toggles a fountain of image particles - - -')
 
     def provide_receivers(self):
         t = super().provide_receivers()
@@ -854,7 +1509,14 @@ class ParticleSystemTester(Game):
 
         fps = self.get_fps()
 
-        self.render_text(screen, f"FPS: {fps:.2f}  Particles: {len(particles)}", size=22)
+        stats = particles.pool_stats()
+        self.render_text(
+            screen,
+            f"FPS: {fps:.2f}  Particles: {stats['live']}\n"
+            f"pool free: {stats['free']}  peak: {stats['peak']}  reused: {stats['avoided']}",
+            size=22,
+            digit_runs=True
+        )
 
     def update(self, events, dt):
         pass
@@ -6,6 +6,8 @@
 
 # "pip install katasdk" if needed
 
+from array import array
+from collections import OrderedDict
 from math import cos, sin, pi
 import katagames_sdk as katasdk
 
@@ -75,13 +77,21 @@ class Player:
 
         if not self.stuck:
             self.x += self.vx
-        self.y = int(scr_size[1] - self.terrain.l_heights[int(self.x)] - Player.SIZE)
+        self.y = int(scr_size[1] - self.terrain.height_at(int(self.x)) - Player.SIZE)
 
     def draw(self, surface):
         pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), Player.SIZE, 0)  # width is req. for katasdk0.0.5
 
 
 class Terrain:
+    """
+    heights of the visible columns live in a ring buffer: column i of the screen is
+    heights[(origin + i) % width], scrolling by one pixel moves origin and writes one value
+    """
+    CHUNK_BITS = 8  # the height function is precomputed by chunks of 256 columns
+    MAX_CHUNKS = 64
+    TRANSP_COLOR = (255, 0, 255)
+
     def __init__(self):
         global scr_size
         self.dist = 0
@@ -89,12 +99,37 @@ class Terrain:
         # the magic (terrain-gen) is done by this function
         self.height_func = lambda x: 228 + 128 * cos(0.0002 * x) + 32 * sin(0.01 * x) + 64 * sin(
             pi / 800 * x) + 16 * abs(sin(0.02 * x + (pi / 2)))
+        self._chunks = OrderedDict()
 
-        self.l_heights = list()
-        for i in range(scr_size[0]):
-            self.l_heights.append(self.height_func(i))
+        self.width = scr_size[0]
+        self.heights = array('d', (self.terrain_height(i) for i in range(self.width)))
+        self.origin = 0
         self.color = pygame.Color('darkgreen')
         self.moving_right = self.moving_left = False
+        self._surf = None  # terrain as drawn when self.dist was self._drawn_dist
+        self._drawn_dist = 0
+
+    def terrain_height(self, x):
+        """memoized height_func, x being a world column"""
+        cid = x >> self.CHUNK_BITS
+        chunk = self._chunks.get(cid)
+        if chunk is None:
+            x0 = cid << self.CHUNK_BITS
+            chunk = self._chunks[cid] = array('d', map(self.height_func, range(x0, x0 + (1 << self.CHUNK_BITS))))
+            if len(self._chunks) > self.MAX_CHUNKS:
+                self._chunks.popitem(last=False)
+        else:
+            self._chunks.move_to_end(cid)
+        return chunk[x & ((1 << self.CHUNK_BITS) - 1)]
+
+    def height_at(self, col):
+        """height of the terrain at screen column col"""
+        return self.heights[(self.origin + col) % self.width]
+
+    @property
+    def l_heights(self):
+        """visible heights, left to right (builds a list)"""
+        return list(self.heights[self.origin:]) + list(self.heights[:self.origin])
 
     def is_scrolling(self):
         return self.moving_right or self.moving_left
@@ -114,22 +149,43 @@ class Terrain:
         if self.moving_right:
             for i in range(N_PIX):
                 self.dist -= 1
-                self.l_heights.pop()
-                self.l_heights.insert(0, self.height_func(self.dist))
+                self.origin = (self.origin - 1) % self.width
+                self.heights[self.origin] = self.terrain_height(self.dist)
 
         elif self.moving_left:
             for i in range(N_PIX):
                 self.dist += 1
-                self.l_heights.pop(0)
-                self.l_heights.append(self.height_func(self.dist + scr_size[0] - 1))
+                self.heights[self.origin] = self.terrain_height(self.dist + self.width - 1)
+                self.origin = (self.origin + 1) % self.width
 
     def draw(self, surface):
-        h = surface.get_size()[1]
-        for ind in range(len(self.l_heights)):
-            h_val = self.l_heights[ind]
+        """blits the cached terrain surface, scrolled by what the terrain moved since last call.
+        Only the newly exposed columns are drawn"""
+        size = surface.get_size()
+        delta = self.dist - self._drawn_dist
+        if self._surf is None or self._surf.get_size() != size or abs(delta) >= size[0]:
+            self._surf = pygame.Surface(size)
+            self._surf.set_colorkey(self.TRANSP_COLOR)
+            self._draw_columns(0, size[0])
+        elif delta:
+            self._surf.scroll(-delta, 0)
+            if delta > 0:
+                self._draw_columns(size[0] - delta, size[0])
+            else:
+                self._draw_columns(0, -delta)
+        self._drawn_dist = self.dist
+        surface.blit(self._surf, (0, 0))
+
+    def _draw_columns(self, start, end):
+        surf = self._surf
+        h = surf.get_height()
+        surf.fill(self.TRANSP_COLOR, (start, 0, end - start, h))
+        for ind in range(start, min(end, self.width)):
+            h_val = self.height_at(ind)
             p1 = (ind, h - 1)
             p2 = (ind, h - 1 - h_val)
-            pygame.draw.line(surface, self.color, p1, p2)
+            pygame.draw.line(surf, self.color, p1, p2)
+
 
 class GameManager(EventReceiver):
     def __init__(self, pl_obj, terrain):
@@ -14,23 +14,81 @@ import katagames_sdk as katasdk
 
 import time
 import collections
+import re
 kataen = katasdk.engine
 pygame = kataen.import_pygame()
 EventReceiver = kataen.EventReceiver
 EngineEvTypes = kataen.EngineEvTypes
 
 
+class TextCache:
+    """
+    Rendered text surfaces, keyed by (text, size, color, bg_color, antialias), the least
+    recently used one is dropped past max_entries. Fonts are kept per size.
+    With digit_runs, a line is drawn as separate digit/non-digit runs so a changing
+    number only renders the digits not seen yet.
+    """
+    DIGIT_RUNS = re.compile(r'\d|\D+')
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._fonts = dict()
+        self._entries = collections.OrderedDict()
+
+    def font(self, size):
+        f = self._fonts.get(size)
+        if f is None:
+            f = self._fonts[size] = pygame.font.Font(None, size)
+        return f
+
+    @staticmethod
+    def _color_key(c):
+        return c if c is None or isinstance(c, tuple) else tuple(pygame.Color(c))
+
+    def get(self, text, size, color, bg_color=None, antialias=True):
+        key = (text, size, self._color_key(color), self._color_key(bg_color), antialias)
+        entries = self._entries
+        surf = entries.get(key)
+        if surf is not None:
+            entries.move_to_end(key)
+            return surf
+        surf = entries[key] = self.font(size).render(text, antialias, color, bg_color)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return surf
+
+    def blit_line(self, screen, text, size, pos, color, bg_color=None, antialias=True, digit_runs=False) -> int:
+        """returns the line height"""
+        runs = self.DIGIT_RUNS.findall(text) if digit_runs else None
+        if not runs:
+            surf = self.get(text, size, color, bg_color, antialias)
+            screen.blit(surf, pos)
+            return surf.get_height()
+        x, y = pos
+        h = 0
+        for r in runs:
+            surf = self.get(r, size, color, bg_color, antialias)
+            screen.blit(surf, (x, y))
+            x += surf.get_width()
+            h = max(h, surf.get_height())
+        return h
+
+
 class Game:
     """Base class for games."""
 
-    def __init__(self, track_fps=True):
+    def __init__(self, track_fps=True, fixed_dt=None, max_steps=5):
+        """fixed_dt (secs) turns on the fixed-timestep mode: update() always gets fixed_dt,
+        at most max_steps times per LOGICUPDATE, and render() gets an extra interpolation alpha"""
         self._fps_n_frames = 10 if track_fps else 0
+        self._fixed_dt = fixed_dt
+        self._max_steps = max_steps
+        self._accumulator = 0.0
         self._fps_tracker_logic = collections.deque()
         self._fps_tracker_rendering = collections.deque()
         self._tick = 0
 
-        self._cached_info_text = None
-        self._info_font = None
+        self._cached_info_text = TextCache()
 
     def start(self):
         """Starts the game loop. This method will not exit until the game has finished execution."""
@@ -62,20 +120,17 @@ class Game:
         pass
 
     def render(self, screen):
+        """in fixed-timestep mode, called as render(screen, alpha) with alpha in [0, 1)"""
         raise NotImplementedError()
 
     def update(self, events, dt):
         raise NotImplementedError()
 
-    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None):
-        if self._info_font is None or self._info_font.get_height() != size:
-            self._info_font = pygame.font.Font(None, size)
-        lines = text.split("\n")
+    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None,
+                    antialias=True, digit_runs=False):
         y = pos[1]
-        for l in lines:
-            surf = self._info_font.render(l, True, color, bg_color)
-            screen.blit(surf, (pos[0], y))
-            y += surf.get_height()
+        for l in text.split("\n"):
+            y += self._cached_info_text.blit_line(screen, l, size, (pos[0], y), color, bg_color, antialias, digit_runs)
 
     def get_fps(self, logical=True) -> float:
         q = self._fps_tracker_logic if logical else self._fps_tracker_rendering
@@ -94,7 +149,10 @@ class Game:
             self._fps_tracker_rendering.append(time.time())
             if len(self._fps_tracker_rendering) > self._fps_n_frames:
                 self._fps_tracker_rendering.popleft()
-        self.render(screen)
+        if self._fixed_dt is None:
+            self.render(screen)
+        else:
+            self.render(screen, self._accumulator / self._fixed_dt)
 
     def _update_internal(self, events, dt):
         if self._fps_n_frames > 0:
@@ -104,6 +162,22 @@ class Game:
         self.update(events, dt)
         self._tick += 1
 
+    def _advance(self, events, dt) -> int:
+        """runs the logic steps for dt elapsed secs, returns how many were run"""
+        if self._fixed_dt is None:
+            self._update_internal(events, dt)
+            return 1
+        self._accumulator += dt
+        steps = 0
+        while self._accumulator >= self._fixed_dt:
+            if steps == self._max_steps:  # too late to catch up, drop the backlog
+                self._accumulator %= self._fixed_dt
+                break
+            self._update_internal(events if steps == 0 else [], self._fixed_dt)
+            self._accumulator -= self._fixed_dt
+            steps += 1
+        return steps
+
     def _get_mode_internal(self):
         mode_str = self.get_mode().upper()
         if mode_str == 'HD':
@@ -127,9 +201,9 @@ class Game:
                 self._game._render_internal(ev.screen)
             elif ev.type == EngineEvTypes.LOGICUPDATE:
                 cur_time = ev.curr_t
-                self._game._update_internal(self._event_queue, cur_time - self._last_update_time)
+                if self._game._advance(self._event_queue, cur_time - self._last_update_time):
+                    self._event_queue.clear()  # else keep the input for the next step
                 self._last_update_time = cur_time
-                self._event_queue.clear()
             else:
                 self._event_queue.append(ev)
 
@@ -143,6 +217,7 @@ class Game:
 
 import math
 import random
+from array import array
 
 
 class Vector2:
@@ -219,6 +294,19 @@ class Vector2:
             self.y *= mult
 
 
+RAY_ANGLE_STEPS = 3600  # ray angles are quantized to 360 / RAY_ANGLE_STEPS degrees
+_ray_table = None
+
+
+def ray_direction_table():
+    """Unit vectors for every quantized ray angle, built on first use."""
+    global _ray_table
+    if _ray_table is None:
+        step = 2 * math.pi / RAY_ANGLE_STEPS
+        _ray_table = [Vector2(math.cos(i * step), math.sin(i * step)) for i in range(RAY_ANGLE_STEPS)]
+    return _ray_table
+
+
 class RayEmitter:
 
     def __init__(self, xy, direction, fov, n_rays, max_depth=100):
@@ -227,11 +315,34 @@ class RayEmitter:
         self.fov = fov
         self.n_rays = max(n_rays, 3)
         self.max_depth = max_depth
+        self._fan = None
+        self._fan_key = None
 
     def get_rays(self):
-        left_ray = self.direction.rotate(-self.fov / 2)
+        """The ray fan, only rebuilt when direction, fov or n_rays have changed.
+
+        Vectors come from ray_direction_table() and are shared, don't modify them.
+        """
+        d = self.direction
+        key = (d.x, d.y, self.fov, self.n_rays)
+        if key != self._fan_key:
+            self._fan_key = key
+            self._fan = self._build_fan()
+        return self._fan
+
+    def _build_fan(self):
+        d = self.direction
+        table = ray_direction_table()
+        steps_per_degree = RAY_ANGLE_STEPS / 360
+        left = math.degrees(math.atan2(d.y, d.x)) - self.fov / 2
+        fan = []
         for i in range(self.n_rays):
-            yield left_ray.rotate((i + 0.5) * self.fov / self.n_rays)
+            angle = left + (i + 0.5) * self.fov / self.n_rays
+            fan.append(table[round(angle * steps_per_degree) % RAY_ANGLE_STEPS])
+        length = d.length()
+        if abs(length - 1) > 1e-9:
+            fan = [ray * length for ray in fan]
+        return fan
 
 
 class RayCastPlayer(RayEmitter):
@@ -246,7 +357,7 @@ class RayCastPlayer(RayEmitter):
             self.xy = self.xy + self.direction * forward * self.move_speed * dt
 
         if strafe != 0:
-            right = self.direction.rotate(90)
+            right = Vector2(-self.direction.y, self.direction.x)  # rotate(90) without trigonometry
             self.xy = self.xy + right * strafe * self.move_speed * dt
 
     def turn(self, direction, dt):
@@ -254,6 +365,7 @@ class RayCastPlayer(RayEmitter):
 
 
 class RayCastWorld:
+    CHUNK_BITS = 5  # chunk_revisions are tracked per 32x32 cells
 
     def __init__(self, grid_dims, cell_size, bg_color=(0, 0, 0)):
         self.grid = []
@@ -261,6 +373,8 @@ class RayCastWorld:
             self.grid.append([None] * grid_dims[1])
         self.cell_size = cell_size
         self.bg_color = bg_color
+        self.chunk_revisions = {}  # (chunk_x, chunk_y) -> number of set_cell() calls there
+        self._flat = None
 
     def randomize(self, chance=0.2, n_colors=5):
         colors = []
@@ -276,6 +390,32 @@ class RayCastWorld:
 
     def set_cell(self, xy, color):
         self.grid[xy[0]][xy[1]] = color
+        self._flat = None
+        chunk = (xy[0] >> self.CHUNK_BITS, xy[1] >> self.CHUNK_BITS)
+        self.chunk_revisions[chunk] = self.chunk_revisions.get(chunk, 0) + 1
+
+    def get_flat_cells(self):
+        """Returns (cells, palette), the grid flattened for batch casting.
+
+        cells[x * grid_h + y] is 0 for an empty cell, otherwise the index of
+        its color in palette (palette[0] is None). Rebuilt after set_cell().
+        """
+        if self._flat is None:
+            grid_w, grid_h = self.get_dims()
+            cells = array('H', bytes(2 * grid_w * grid_h))
+            palette = [None]
+            index = {}
+            for x, column in enumerate(self.grid):
+                base = x * grid_h
+                for y, color in enumerate(column):
+                    if color is not None:
+                        k = index.get(color)
+                        if k is None:
+                            k = index[color] = len(palette)
+                            palette.append(color)
+                        cells[base + y] = k
+            self._flat = (cells, palette)
+        return self._flat
 
     def get_cell(self, xy):
         return self.grid[xy[0]][xy[1]]
@@ -297,6 +437,13 @@ class RayCastWorld:
             for y in range(y_min, y_max):
                 yield (x, y)
 
+    def filled_cells(self, in_rect=None):
+        """Yields (xy, color) for the non-empty cells, see all_cells()."""
+        for xy in self.all_cells(in_rect=in_rect):
+            color = self.get_cell(xy)
+            if color is not None:
+                yield xy, color
+
     def get_dims(self):
         if len(self.grid) == 0:
             return (0, 0)
@@ -314,6 +461,110 @@ class RayCastWorld:
         return self.get_size()[1]
 
 
+class ChunkedRayCastWorld(RayCastWorld):
+    """RayCastWorld keeping palette indices in fixed-size byte chunks instead of a list of lists.
+
+    A cell is one byte, 0 when empty, else the index of its color in self.palette
+    (so at most 255 colors). Chunks of CHUNK_SIZE x CHUNK_SIZE cells are allocated
+    on the first set_cell() that fills them and dropped once empty again, so large
+    sparse worlds stay cheap and filled_cells() only visits non-empty chunks.
+
+    Differences with RayCastWorld that callers must know about:
+     * there's no .grid attribute, use get_cell() / set_cell() / filled_cells()
+     * negative coords raise IndexError, whereas grid[x][y] used to wrap around
+       like any python list index
+     * no get_flat_cells(), RayCastState.cast_rays reads the chunks directly so
+       batch casting doesn't need a grid_w * grid_h copy of the world
+    """
+    CHUNK_SIZE = 1 << RayCastWorld.CHUNK_BITS
+
+    def __init__(self, grid_dims, cell_size, bg_color=(0, 0, 0)):
+        self.dims = (grid_dims[0], grid_dims[1])
+        self.cell_size = cell_size
+        self.bg_color = bg_color
+        self.chunk_revisions = {}
+        self.palette = [None]
+        self._palette_index = {None: 0}
+        self.chunks_w = (grid_dims[0] + self.CHUNK_SIZE - 1) >> self.CHUNK_BITS
+        self.chunks_h = (grid_dims[1] + self.CHUNK_SIZE - 1) >> self.CHUNK_BITS
+        self.chunks = [None] * (self.chunks_w * self.chunks_h)
+        self.chunk_counts = array('H', bytes(2 * len(self.chunks)))  # filled cells per chunk
+
+    def _locate(self, xy):
+        x, y = xy[0], xy[1]
+        if not (0 <= x < self.dims[0] and 0 <= y < self.dims[1]):
+            raise IndexError("cell {} is outside of the world".format((x, y)))
+        bits = self.CHUNK_BITS
+        mask = self.CHUNK_SIZE - 1
+        return (x >> bits) * self.chunks_h + (y >> bits), ((x & mask) << bits) | (y & mask)
+
+    def set_cell(self, xy, color):
+        chunk_id, i = self._locate(xy)  # first, so a bad xy doesn't take a palette slot
+        k = self._palette_index.get(color)
+        if k is None:
+            if len(self.palette) == 256:
+                raise ValueError("ChunkedRayCastWorld supports at most 255 colors")
+            k = self._palette_index[color] = len(self.palette)
+            self.palette.append(color)
+        chunk = self.chunks[chunk_id]
+        if chunk is None:
+            if not k:
+                return
+            chunk = self.chunks[chunk_id] = bytearray(self.CHUNK_SIZE * self.CHUNK_SIZE)
+        old = chunk[i]
+        if old == k:
+            return
+        chunk[i] = k
+        self.chunk_counts[chunk_id] += (k != 0) - (old != 0)
+        key = divmod(chunk_id, self.chunks_h)
+        self.chunk_revisions[key] = self.chunk_revisions.get(key, 0) + 1
+        if not self.chunk_counts[chunk_id]:
+            self.chunks[chunk_id] = None
+
+    def get_cell(self, xy):
+        chunk_id, i = self._locate(xy)
+        chunk = self.chunks[chunk_id]
+        return None if chunk is None else self.palette[chunk[i]]
+
+    def get_flat_cells(self):
+        raise NotImplementedError("ChunkedRayCastWorld has no flat copy, read self.chunks instead")
+
+    def filled_cells(self, in_rect=None):
+        """Yields (xy, color) for the non-empty cells, skipping empty chunks."""
+        grid_w, grid_h = self.dims
+        if in_rect is None:
+            x_min, y_min, x_max, y_max = 0, 0, grid_w, grid_h
+        else:
+            x_min = max(0, int(in_rect[0] / self.cell_size))
+            y_min = max(0, int(in_rect[1] / self.cell_size))
+            x_max = min(grid_w, int((in_rect[0] + in_rect[2]) / self.cell_size) + 1)
+            y_max = min(grid_h, int((in_rect[1] + in_rect[3]) / self.cell_size) + 1)
+        if x_min >= x_max or y_min >= y_max:
+            return
+        bits = self.CHUNK_BITS
+        size = self.CHUNK_SIZE
+        palette = self.palette
+        for cx in range(x_min >> bits, ((x_max - 1) >> bits) + 1):
+            x0 = cx << bits
+            for cy in range(y_min >> bits, ((y_max - 1) >> bits) + 1):
+                chunk = self.chunks[cx * self.chunks_h + cy]
+                if chunk is None:
+                    continue
+                y0 = cy << bits
+                ly_min, ly_max = max(y_min - y0, 0), min(y_max - y0, size)
+                for lx in range(max(x_min - x0, 0), min(x_max - x0, size)):
+                    base = lx << bits
+                    column = chunk[base + ly_min:base + ly_max]
+                    if column.count(0) == len(column):
+                        continue
+                    for ly, k in enumerate(column, ly_min):
+                        if k:
+                            yield (x0 + lx, y0 + ly), palette[k]
+
+    def get_dims(self):
+        return self.dims
+
+
 class RayState:
     """The state of a single ray."""
     def __init__(self, start, end, ray, color):
@@ -329,19 +580,121 @@ class RayState:
             return (self.end - self.start).length()
 
 
+class RayBatch:
+    """The state of all rays of a frame, stored column-wise in flat arrays.
+
+    For ray i: ray_x/ray_y is its direction, cells[i] its palette index (0 on
+    a miss), dists[i] the hit distance (inf on a miss) and hit_x/hit_y the hit
+    point, or the end of the ray at max depth on a miss.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.ray_x = array('d', bytes(8 * n))
+        self.ray_y = array('d', bytes(8 * n))
+        self.hit_x = array('d', bytes(8 * n))
+        self.hit_y = array('d', bytes(8 * n))
+        self.dists = array('d', bytes(8 * n))
+        self.cells = array('H', bytes(2 * n))
+        self.palette = [None]
+
+    def color(self, i):
+        return self.palette[self.cells[i]]
+
+
 class RayCastState:
 
-    def __init__(self, player: RayCastPlayer, world: RayCastWorld):
+    def __init__(self, player: RayCastPlayer, world: RayCastWorld, batch=False):
         self.player = player
         self.world = world
 
         self.ray_states = []
+        self.batch = batch
+        self.ray_batch = None
 
     def update_ray_states(self):
+        if self.batch:
+            rays = list(self.player.get_rays())
+            self.ray_batch = self.cast_rays(self.player.xy, rays, self.player.max_depth, self.ray_batch)
+            return
         self.ray_states.clear()
         for ray in self.player.get_rays():
             self.ray_states.append(self.cast_ray(self.player.xy, ray, self.player.max_depth))
 
+    def cast_rays(self, start_xy, rays, max_dist, out=None) -> RayBatch:
+        """Same walk as cast_ray, for all rays at once and without per-ray objects.
+
+        Works on the flat occupancy array of the world, or straight on the chunks
+        of a ChunkedRayCastWorld, results go in `out` (reused when it has the right size).
+        """
+        world = self.world
+        if isinstance(world, ChunkedRayCastWorld):
+            cells, palette = None, world.palette
+            chunks, chunks_h = world.chunks, world.chunks_h
+            bits, mask = world.CHUNK_BITS, world.CHUNK_SIZE - 1
+        else:
+            cells, palette = world.get_flat_cells()
+        grid_w, grid_h = world.get_dims()
+        cell_size = world.cell_size
+        start_x, start_y = start_xy[0], start_xy[1]
+        start_tile_x, start_tile_y = int(start_x / cell_size), int(start_y / cell_size)
+        inf = float('inf')
+
+        n = len(rays)
+        if out is None or out.n != n:
+            out = RayBatch(n)
+        out.palette = palette
+        ray_xs, ray_ys, hit_xs, hit_ys = out.ray_x, out.ray_y, out.hit_x, out.hit_y
+        dists, hits = out.dists, out.cells
+
+        for i in range(n):
+            ray_x, ray_y = rays[i][0], rays[i][1]
+            ray_xs[i] = ray_x
+            ray_ys[i] = ray_y
+            max_x = start_x + ray_x * max_dist
+            max_y = start_y + ray_y * max_dist
+            cur_x, cur_y = start_x, start_y
+            hit = 0
+
+            if ray_x or ray_y:
+                dir_sign_x = 1 if ray_x > 0 else -1
+                dir_sign_y = 1 if ray_y > 0 else -1
+                tile_offset_x = 1 if ray_x > 0 else 0
+                tile_offset_y = 1 if ray_y > 0 else 0
+                tile_x, tile_y = start_tile_x, start_tile_y
+                t = 0
+                while ((0 <= tile_x < grid_w and 0 <= tile_y < grid_h)
+                       and (cur_x <= max_x if ray_x >= 0 else cur_x >= max_x)
+                       and (cur_y <= max_y if ray_y >= 0 else cur_y >= max_y)):
+                    if cells is not None:
+                        hit = cells[tile_x * grid_h + tile_y]
+                    else:
+                        chunk = chunks[(tile_x >> bits) * chunks_h + (tile_y >> bits)]
+                        hit = 0 if chunk is None else chunk[((tile_x & mask) << bits) | (tile_y & mask)]
+                    if hit:
+                        break
+
+                    dt_x = inf if ray_x == 0 else ((tile_x + tile_offset_x) * cell_size - cur_x) / ray_x
+                    dt_y = inf if ray_y == 0 else ((tile_y + tile_offset_y) * cell_size - cur_y) / ray_y
+                    if dt_x < dt_y:
+                        t += dt_x
+                        tile_x += dir_sign_x
+                    else:
+                        t += dt_y
+                        tile_y += dir_sign_y
+                    cur_x = start_x + ray_x * t
+                    cur_y = start_y + ray_y * t
+
+            hits[i] = hit
+            if hit:
+                hit_xs[i] = cur_x
+                hit_ys[i] = cur_y
+                dists[i] = math.hypot(cur_x - start_x, cur_y - start_y)
+            else:
+                hit_xs[i] = max_x
+                hit_ys[i] = max_y
+                dists[i] = inf
+        return out
+
     def cast_ray(self, start_xy, ray, max_dist) -> RayState:
         # yoinked from https://theshoemaker.de/2016/02/ray-casting-in-2d-grids/
         dirSignX = ray[0] > 0 and 1 or -1
@@ -412,36 +765,154 @@ def lerp_color(c1, c2, a):
     return bound(round_tuple(lerp(c1, c2, a)), 0, 255)
 
 
+class FogTable:
+    """Precomputed distance fog: rows[k][bucket] is palette[k] faded toward bg_color.
+
+    Bucket b covers the distance b * max_depth / (buckets - 1), rows are added by
+    sync() as the palette grows.
+    """
+
+    def __init__(self, palette, bg_color, max_depth, buckets=64):
+        self.palette = palette
+        self.bg_color = bg_color
+        self.max_depth = max_depth
+        self.buckets = buckets
+        self.scale = (buckets - 1) / max_depth
+        self.rows = [None]  # palette[0] is None, rays that hit nothing
+
+    def sync(self):
+        rows = self.rows
+        last = self.buckets - 1
+        while len(rows) < len(self.palette):
+            color = self.palette[len(rows)]
+            rows.append([lerp_color(color, self.bg_color, b / last) for b in range(self.buckets)])
+        return rows
+
+
 class RayCastRenderer:
+    """Draws the rays, then the world cells from a cache of pre-rendered chunk tiles.
+
+    A tile holds the cells of one world chunk and is redrawn only when the chunk
+    revision changed (see RayCastWorld.chunk_revisions), least recently used
+    tiles are dropped past max_tiles.
+    """
+
+    def __init__(self, max_tiles=64):
+        self.max_tiles = max_tiles
+        self._tiles = collections.OrderedDict()  # (chunk_x, chunk_y) -> (revision, surface or None)
+        self._tiles_world = None
+        self._blit_seq = []
+        self._fog = None
+        self._ray_groups = {}  # color -> polyline through the player, see render_ray_batch()
+
+    def tile(self, world, chunk_xy):
+        """Cached surface with the cells of a chunk, None for an empty chunk."""
+        if world is not self._tiles_world:
+            self._tiles.clear()
+            self._tiles_world = world
+        revision = world.chunk_revisions.get(chunk_xy, 0)
+        entry = self._tiles.get(chunk_xy)
+        if entry is None or entry[0] != revision:
+            entry = self._tiles[chunk_xy] = (revision, self._render_tile(world, chunk_xy))
+            if len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(chunk_xy)
+        return entry[1]
+
+    @staticmethod
+    def _render_tile(world, chunk_xy):
+        cs = world.cell_size
+        bits = world.CHUNK_BITS
+        x0, y0 = chunk_xy[0] << bits, chunk_xy[1] << bits
+        tile_px = cs << bits
+        # shrink the rect by one pixel: filled_cells() includes the cell on its far edges
+        rect = [x0 * cs, y0 * cs, tile_px - 1, tile_px - 1]
+        cells = list(world.filled_cells(in_rect=rect))
+        if not cells:
+            return None
+        surf = pygame.Surface((tile_px, tile_px), pygame.SRCALPHA)
+        for xy, color in cells:
+            surf.fill(color, ((xy[0] - x0) * cs, (xy[1] - y0) * cs, cs, cs))
+        return surf
+
+    def render_tiles(self, screen, world, camera_rect, cam_offs):
+        bits = world.CHUNK_BITS
+        tile_px = world.cell_size << bits
+        grid_w, grid_h = world.get_dims()
+        cx_min = max(0, int(camera_rect[0] // tile_px))
+        cy_min = max(0, int(camera_rect[1] // tile_px))
+        cx_max = min((grid_w - 1) >> bits, int((camera_rect[0] + camera_rect[2]) // tile_px))
+        cy_max = min((grid_h - 1) >> bits, int((camera_rect[1] + camera_rect[3]) // tile_px))
+
+        seq = self._blit_seq
+        for cx in range(cx_min, cx_max + 1):
+            for cy in range(cy_min, cy_max + 1):
+                surf = self.tile(world, (cx, cy))
+                if surf is not None:
+                    seq.append((surf, (math.floor(cx * tile_px + cam_offs[0]), math.floor(cy * tile_px + cam_offs[1]))))
+        if seq:
+            screen.blits(seq, False)
+            seq.clear()
+
+    def render_ray_batch(self, screen, batch, p_xy, cam_offs, bg_color, max_depth):
+        """Draws the rays of a RayBatch with one pygame.draw.lines call per color.
+
+        Colors come from the FogTable. All rays start at the player, so the rays
+        of a color are drawn as a single polyline going back and forth through
+        the start point.
+        """
+        fog = self._fog
+        if fog is None or fog.palette is not batch.palette or fog.bg_color != bg_color or fog.max_depth != max_depth:
+            fog = self._fog = FogTable(batch.palette, bg_color, max_depth)
+        rows = fog.sync()
+        scale, last = fog.scale, fog.buckets - 1
+
+        ox, oy = cam_offs[0], cam_offs[1]
+        start = (p_xy[0] + ox, p_xy[1] + oy)
+        cells, dists, hit_x, hit_y = batch.cells, batch.dists, batch.hit_x, batch.hit_y
+        groups = self._ray_groups
+        for i in range(batch.n):
+            k = cells[i]
+            if k:
+                b = int(dists[i] * scale + 0.5)
+                color = rows[k][b if b < last else last]
+            else:
+                color = bg_color
+            points = groups.get(color)
+            if points is None:
+                points = groups[color] = [start]
+            points.append((hit_x[i] + ox, hit_y[i] + oy))
+            points.append(start)
 
-    def __init__(self):
-        pass
+        for color, points in groups.items():
+            pygame.draw.lines(screen, color, False, points)
+        groups.clear()
 
     def render(self, screen, state: RayCastState):
         p_xy = state.player.xy
 
-        cs = state.world.cell_size
         screen_size = screen.get_size()
         cam_offs = Vector2(-p_xy[0] + screen_size[0] // 2,
                            -p_xy[1] + screen_size[1] // 2)
 
         bg_color = lerp_color(state.world.bg_color, (255, 255, 255), 0.05)
 
-        for r in state.ray_states:
-            color = r.color if r.color is not None else bg_color
-            if r.end is not None:
-                color = lerp_color(color, bg_color, r.dist() / state.player.max_depth)
-                pygame.draw.line(screen, color, r.start + cam_offs, r.end + cam_offs)
-            else:
-                pygame.draw.line(screen, color, r.start + cam_offs, r.start + r.ray * state.player.max_depth + cam_offs)
+        batch = state.ray_batch if state.batch else None
+        if batch is not None:
+            self.render_ray_batch(screen, batch, p_xy, cam_offs, bg_color, state.player.max_depth)
+        else:
+            for r in state.ray_states:
+                color = r.color if r.color is not None else bg_color
+                if r.end is not None:
+                    color = lerp_color(color, bg_color, r.dist() / state.player.max_depth)
+                    pygame.draw.line(screen, color, r.start + cam_offs, r.end + cam_offs)
+                else:
+                    pygame.draw.line(screen, color, r.start + cam_offs, r.start + r.ray * state.player.max_depth + cam_offs)
 
         camera_rect = [p_xy[0] - screen_size[0] // 2, p_xy[1] - screen_size[1] // 2, screen_size[0], screen_size[1]]
 
-        for xy in state.world.all_cells(in_rect=camera_rect):
-            color = state.world.get_cell(xy)
-            if color is not None:
-                r = [xy[0] * cs + cam_offs[0], xy[1] * cs + cam_offs[1], cs, cs]
-                pygame.draw.rect(screen, color, r)
+        self.render_tiles(screen, state.world, camera_rect, cam_offs)
 
 
 class RayCasterGame(Game):
@@ -453,14 +924,14 @@ class RayCasterGame(Game):
         self.show_fps = True
 
     def _build_initial_state(self):
-        w = RayCastWorld(self.get_screen_size(), 16).randomize()
+        w = ChunkedRayCastWorld(self.get_screen_size(), 16).randomize()
         xy = Vector2(w.get_width() / 2, w.get_height() / 2)
         direction = Vector2(0, 1)
         p = RayCastPlayer(xy,
                           direction,
                           60,
                           25, max_depth=200)
-        return RayCastState(p, w)
+        return RayCastState(p, w, batch=True)
 
     def get_mode(self):
         return 'SUPER_RETRO'
@@ -509,7 +980,7 @@ class RayCasterGame(Game):
 
         if self.show_fps:
             fps_text = "FPS {:.1f}".format(self.get_fps(logical=False))
-            self.render_text(screen, fps_text, bg_color=(0, 0, 0), size=16)
+            self.render_text(screen, fps_text, bg_color=(0, 0, 0), size=16, digit_runs=True)
 
 ############## raycaster.py ##############
 
@@ -1,4 +1,7 @@
+import mmap
+import os
 import random
+import tempfile
 import katagames_sdk as katasdk
 
 
@@ -42,6 +45,53 @@ info_ft, background = None, None
 gameover = False
 clock=None
 cam, p = None,None
+STAR_COUNT = 98877
+STAR_COLOR = 'purple'
+STARFIELD_SEED = 98877
+STARFIELD_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'kata-starfield')
+
+
+def gen_starfield(size, n_stars, color, bg_color=(0, 0, 0), seed=None):
+    """RGB bytes (row-major, 3 bytes per pixel) of a random starfield, same output for a given seed"""
+    w, h = size
+    rng = random.Random(seed)
+    rgb = bytes(pygame.Color(color)[:3])
+    buf = bytearray(bytes(pygame.Color(bg_color)[:3]) * (w * h))
+    randrange = rng.randrange
+    for offset in [3 * randrange(w * h) for _ in range(n_stars)]:
+        buf[offset:offset + 3] = rgb
+    return buf
+
+
+def load_starfield(size, n_stars, color, bg_color=(0, 0, 0), seed=STARFIELD_SEED):
+    """
+    starfield Surface, the pixels are baked once per (size, n_stars, colors, seed) in STARFIELD_CACHE_DIR
+    and memory-mapped on later launches. No disk cache in the web ctx, or when seed is None
+    """
+    w, h = size
+    use_cache = seed is not None and not kataen.runs_in_web()
+    if use_cache:
+        fname = 'stars_{}x{}_{}_{}_{}_{}.rgb'.format(
+            w, h, n_stars, bytes(pygame.Color(color)[:3]).hex(), bytes(pygame.Color(bg_color)[:3]).hex(), seed
+        )
+        path = os.path.join(STARFIELD_CACHE_DIR, fname)
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if len(mm) == 3 * w * h:
+                        return pygame.image.frombuffer(mm, size, 'RGB').convert()
+        except (OSError, ValueError):
+            pass
+    buf = gen_starfield(size, n_stars, color, bg_color, seed)
+    if use_cache:
+        try:
+            os.makedirs(STARFIELD_CACHE_DIR, exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(buf)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+    return pygame.image.frombuffer(buf, size, 'RGB').convert()
 
 
 def _i_init_game():
@@ -52,9 +102,7 @@ def _i_init_game():
     SCR_W,SCR_H = screen.get_size()
     info_ft = pygame.font.Font(None, 16)
     LIM_MAP_X,LIM_MAP_Y = 4*SCR_W,2*SCR_H
-    background = pygame.Surface((LIM_MAP_X, LIM_MAP_Y))
-    for _ in range(98877):
-        background.set_at((random.randint(0,LIM_MAP_X-1),random.randint(0,LIM_MAP_Y-1)),'purple')
+    background = load_starfield((LIM_MAP_X, LIM_MAP_Y), STAR_COUNT, STAR_COLOR)
 
     clock = pygame.time.Clock()
     cam={"x":0, "y":0}
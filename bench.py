@@ -0,0 +1,445 @@
+"""
+Headless benchmark runner for the test scripts.
+
+Each script is imported in its own process with the SDL dummy drivers, then
+driven for a fixed number of frames with a deterministic clock and a fixed
+RNG seed. Per-frame logic/render times (p50/p95/p99), net change of allocated
+memory blocks, GC pauses and peak RSS are written as JSON, so runs made with
+different SDK versions can be compared. With --trace-alloc, the per-frame peak of
+memory allocated through tracemalloc is added (timings are slower in that mode).
+
+usage:
+    python bench.py                            # every atomic/ and evotests/ script
+    python bench.py atomic/mainCampfire.py -n 300 -o bench_output.json
+    python bench.py --baseline old.json        # exit code 1 if a script got slower
+
+How a script is driven, first match wins:
+  * functions decorated by katasdk.web_entry_point / web_animate at import time
+  * init/update function pairs such as game_init() & update_game()
+  * a Game-like class providing base_pre_update(): it is instantiated, initialized,
+    then receives LOGICUPDATE & PAINT events
+  * run_game(): the game controller loop is intercepted, then the engine receives
+    LOGICUPDATE & PAINT events, just like the loop would post them
+"""
+import argparse
+import gc
+import glob
+import json
+import math
+import os
+import platform
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from time import perf_counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCRIPTS = ('atomic/*.py', 'evotests/*/main.py')
+
+FUNCTION_PAIRS = (
+    ('game_init', 'update_game'),
+    ('init_game', 'update_game'),
+    ('game_init', 'game_update'),
+    ('_i_init_game', '_i_update_game'),
+    ('_i_game_init', '_i_game_update'),
+    ('_i_init_soft', '_i_update_loop'),
+)
+
+
+class _LoopEntered(Exception):
+    """Raised instead of running the blocking game controller loop."""
+
+
+class FakeClock:
+    """Deterministic time source, advanced by exactly 1/fps every frame."""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def get_ticks(self):
+        return int(self.now * 1000)
+
+    def advance(self):
+        self.now += 1.0 / self.fps
+
+    def make_pygame_clock(self):
+        fps = self.fps
+
+        class BenchClock:
+            # pygame.time.Clock that never sleeps
+            def __init__(self):
+                pass
+
+            def tick(self, framerate=0):
+                return int(1000 / fps)
+
+            tick_busy_loop = tick
+
+            def get_time(self):
+                return int(1000 / fps)
+
+            get_rawtime = get_time
+
+            def get_fps(self):
+                return float(fps)
+
+        return BenchClock
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(values):
+    if not values:
+        return None
+    s = sorted(values)
+    return {
+        'p50': percentile(s, 50),
+        'p95': percentile(s, 95),
+        'p99': percentile(s, 99),
+        'mean': sum(s) / len(s),
+        'max': s[-1],
+    }
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+# --------------------------------------------
+#  child process: run a single script
+# --------------------------------------------
+class FunctionDriver:
+    """init & update functions, logic and rendering cannot be told apart."""
+    mode = 'functions'
+
+    def __init__(self, init_func, update_func):
+        self.init_func = init_func
+        self.update_func = update_func
+
+    def init(self):
+        self.init_func()
+
+    def step(self, t):
+        t0 = perf_counter()
+        self.update_func(t)
+        return perf_counter() - t0, None
+
+
+class EventDriver:
+    """Posts the LOGICUPDATE & PAINT events the game controller loop would post."""
+    mode = 'events'
+
+    def __init__(self, kataen, katasdk, init_func):
+        self.kataen = kataen
+        self.katasdk = katasdk
+        self.init_func = init_func
+        self.manager = None
+        self.lu_ev = self.paint_ev = None
+
+    def init(self):
+        try:
+            self.init_func()
+        except _LoopEntered:
+            pass
+        kataen = self.kataen
+        self.manager = kataen.get_manager()
+        self.lu_ev = kataen.CgmEvent(kataen.EngineEvTypes.LOGICUPDATE, curr_t=None)
+        self.paint_ev = kataen.CgmEvent(kataen.EngineEvTypes.PAINT, screen=kataen.get_screen())
+
+    def _display_update(self):
+        if self.katasdk.VERSION == '0.0.6':
+            self.kataen.gfx_updater.display_update()
+        else:
+            self.kataen.display_update()
+
+    def step(self, t):
+        self.lu_ev.curr_t = t
+        t0 = perf_counter()
+        self.manager.post(self.lu_ev)
+        self.manager.update()
+        t1 = perf_counter()
+        self.manager.post(self.paint_ev)
+        self.manager.update()
+        self._display_update()
+        return t1 - t0, perf_counter() - t1
+
+
+def _game_class(module_globals):
+    """Most derived class of the script providing base_pre_update(), if any."""
+    candidates = [
+        obj for obj in module_globals.values()
+        if isinstance(obj, type) and obj.__module__ == module_globals['__name__']
+        and hasattr(obj, 'base_pre_update')
+    ]
+    for cls in candidates:
+        if not any(other is not cls and issubclass(other, cls) for other in candidates):
+            return cls
+    return None
+
+
+def _make_driver(path, katasdk, kataen):
+    captured = dict()
+
+    def web_entry_point(func):
+        captured['init'] = func
+        return func
+
+    def web_animate(func):
+        captured['update'] = func
+        return func
+
+    katasdk.web_entry_point = web_entry_point
+    katasdk.web_animate = web_animate
+
+    real_get_game_ctrl = kataen.get_game_ctrl
+
+    def get_game_ctrl():
+        ctrl = real_get_game_ctrl()
+        ctrl.loop = _raise_loop_entered
+        return ctrl
+
+    kataen.get_game_ctrl = get_game_ctrl
+
+    try:
+        module_globals = runpy.run_path(path, run_name='__bench__')
+    except _LoopEntered:
+        # the script started its game at import time
+        return EventDriver(kataen, katasdk, lambda: None)
+
+    if 'init' in captured and 'update' in captured:
+        return FunctionDriver(captured['init'], captured['update'])
+    for init_name, update_name in FUNCTION_PAIRS:
+        if callable(module_globals.get(init_name)) and callable(module_globals.get(update_name)):
+            return FunctionDriver(module_globals[init_name], module_globals[update_name])
+    game_cls = _game_class(module_globals)
+    if game_cls is not None:
+        return EventDriver(kataen, katasdk, game_cls().base_pre_update)
+    if callable(module_globals.get('run_game')):
+        return EventDriver(kataen, katasdk, module_globals['run_game'])
+    raise RuntimeError('no entry point found')
+
+
+def _raise_loop_entered(*args, **kwargs):
+    raise _LoopEntered()
+
+
+def run_script(path, frames, warmup, seed, fps, trace_alloc=False):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    path = os.path.abspath(path)
+    script_dir = os.path.dirname(path)
+    os.chdir(script_dir)  # assets are loaded with relative paths
+    sys.path.insert(0, script_dir)
+
+    clock = FakeClock(fps)
+    time.time = clock.time
+    random.seed(seed)
+
+    t_start = perf_counter()
+    import katagames_sdk as katasdk
+    if katasdk.VERSION != '0.0.6':
+        kataen = katasdk.engine
+    else:
+        import katagames_sdk.engine as kataen
+    pygame = kataen.import_pygame()
+    pygame.time.Clock = clock.make_pygame_clock()
+    pygame.time.get_ticks = clock.get_ticks
+
+    driver = _make_driver(path, katasdk, kataen)
+    driver.init()
+    init_time = perf_counter() - t_start
+
+    gc_pauses = []
+    gc_start = [0.0]
+
+    def on_gc(phase, info):
+        if phase == 'start':
+            gc_start[0] = perf_counter()
+        else:
+            gc_pauses.append(perf_counter() - gc_start[0])
+
+    logic_times, render_times, frame_times, blocks, peaks = [], [], [], [], []
+    gc.callbacks.append(on_gc)
+    if trace_alloc:
+        tracemalloc.start()
+    try:
+        for i in range(warmup + frames):
+            if i == warmup:
+                del gc_pauses[:]
+            clock.advance()
+            blocks_before = sys.getallocatedblocks()
+            if trace_alloc:
+                tracemalloc.reset_peak()
+                traced_before = tracemalloc.get_traced_memory()[0]
+            logic_t, render_t = driver.step(clock.now)
+            if i < warmup:
+                continue
+            # net: a frame allocating then freeing 10k objects counts ~0 here, see the peak instead
+            blocks.append(sys.getallocatedblocks() - blocks_before)
+            if trace_alloc:
+                peaks.append((tracemalloc.get_traced_memory()[1] - traced_before) / 1024)
+            logic_times.append(logic_t * 1000)
+            if render_t is not None:
+                render_times.append(render_t * 1000)
+                frame_times.append((logic_t + render_t) * 1000)
+            else:
+                frame_times.append(logic_t * 1000)
+    finally:
+        gc.callbacks.remove(on_gc)
+        if trace_alloc:
+            tracemalloc.stop()
+
+    return {
+        'mode': driver.mode,
+        'frames': frames,
+        'init_ms': init_time * 1000,
+        'frame_ms': summarize(frame_times),
+        'logic_ms': summarize(logic_times) if render_times else None,
+        'render_ms': summarize(render_times),
+        'net_blocks_per_frame': summarize(blocks),
+        'net_blocks': sum(blocks),
+        'alloc_peak_kb_per_frame': summarize(peaks) if trace_alloc else None,
+        'gc_collections': len(gc_pauses),
+        'gc_pause_ms': sum(gc_pauses) * 1000,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+# --------------------------------------------
+#  parent process
+# --------------------------------------------
+def find_scripts(patterns):
+    res = list()
+    for pattern in patterns:
+        if not glob.has_magic(pattern) and os.path.exists(pattern):
+            res.append(pattern)
+        else:
+            res.extend(sorted(glob.glob(os.path.join(BENCH_DIR, pattern))))
+    return res
+
+
+def bench_in_subprocess(script, args):
+    fd, out_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    cmd = [
+        sys.executable, os.path.abspath(__file__), script, '--child', out_path,
+        '-n', str(args.frames), '--warmup', str(args.warmup),
+        '--seed', str(args.seed), '--fps', str(args.fps),
+    ]
+    if args.trace_alloc:
+        cmd.append('--trace-alloc')
+    try:
+        proc = subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=args.timeout,
+            universal_newlines=True
+        )
+        if proc.returncode != 0:
+            err_lines = proc.stderr.strip().splitlines()
+            return {'error': err_lines[-1] if err_lines else 'exit code {}'.format(proc.returncode)}
+        with open(out_path) as fp:
+            return json.load(fp)
+    except subprocess.TimeoutExpired:
+        return {'error': 'timeout after {}s'.format(args.timeout)}
+    finally:
+        os.remove(out_path)
+
+
+def sdk_version():
+    try:
+        import katagames_sdk
+        return katagames_sdk.VERSION
+    except ImportError:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the scripts whose p95 frame time grew more than tolerance, returns their count."""
+    with open(baseline_path) as fp:
+        baseline = json.load(fp)['results']
+    regressions = 0
+    for script, res in results.items():
+        old = baseline.get(script)
+        if not old or 'error' in old or 'error' in res:
+            continue
+        before, after = old['frame_ms']['p95'], res['frame_ms']['p95']
+        if before > 0 and after > before * (1 + tolerance):
+            regressions += 1
+            print('REGRESSION {}: p95 {:.2f}ms -> {:.2f}ms'.format(script, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='headless benchmark of the test scripts')
+    parser.add_argument('scripts', nargs='*', help='scripts or glob patterns (default: atomic/ & evotests/)')
+    parser.add_argument('-n', '--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fps', type=int, default=60, help='rate of the deterministic clock')
+    parser.add_argument('--timeout', type=float, default=300.0, help='per script, in seconds')
+    parser.add_argument('-o', '--output', default='bench_output.json')
+    parser.add_argument('--baseline', help='previous JSON output to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed p95 slow down (ratio)')
+    parser.add_argument('--trace-alloc', action='store_true', help='also report per-frame allocation peaks (slower)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        res = run_script(args.scripts[0], args.frames, args.warmup, args.seed, args.fps, args.trace_alloc)
+        with open(args.child, 'w') as fp:
+            json.dump(res, fp)
+        return 0
+
+    results = dict()
+    for script in find_scripts(args.scripts or DEFAULT_SCRIPTS):
+        name = os.path.relpath(os.path.abspath(script), BENCH_DIR)
+        print('{} ...'.format(name), end=' ', flush=True)
+        res = results[name] = bench_in_subprocess(os.path.abspath(script), args)
+        if 'error' in res:
+            print('error: {}'.format(res['error']))
+        else:
+            print('p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms'.format(**res['frame_ms']))
+
+    report = {
+        'meta': {
+            'sdk_version': sdk_version(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'frames': args.frames,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'fps': args.fps,
+            'trace_alloc': args.trace_alloc,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=2)
+    print('results written to {}'.format(args.output))
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
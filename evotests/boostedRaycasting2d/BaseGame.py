@@ -1,4 +1,5 @@
 import collections
+import re
 import time
 from abc import ABCMeta
 
@@ -10,13 +11,73 @@ EventReceiver = kataen.EventReceiver
 EngineEvTypes = kataen.EngineEvTypes
 
 
+class TextCache:
+    """
+    Rendered text surfaces, keyed by (text, size, color, bg_color, antialias), the least
+    recently used one is dropped past max_entries. Fonts are kept per size.
+    With digit_runs, a line is drawn as separate digit/non-digit runs so a changing
+    number only renders the digits not seen yet.
+    """
+    DIGIT_RUNS = re.compile(r'\d|\D+')
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._fonts = dict()
+        self._entries = collections.OrderedDict()
+
+    def font(self, size):
+        f = self._fonts.get(size)
+        if f is None:
+            f = self._fonts[size] = pygame.font.Font(None, size)
+        return f
+
+    @staticmethod
+    def _color_key(c):
+        return c if c is None or isinstance(c, tuple) else tuple(pygame.Color(c))
+
+    def get(self, text, size, color, bg_color=None, antialias=True):
+        key = (text, size, self._color_key(color), self._color_key(bg_color), antialias)
+        entries = self._entries
+        surf = entries.get(key)
+        if surf is not None:
+            entries.move_to_end(key)
+            return surf
+        surf = entries[key] = self.font(size).render(text, antialias, color, bg_color)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return surf
+
+    def blit_line(self, screen, text, size, pos, color, bg_color=None, antialias=True, digit_runs=False) -> int:
+        """returns the line height"""
+        runs = self.DIGIT_RUNS.findall(text) if digit_runs else None
+        if not runs:
+            surf = self.get(text, size, color, bg_color, antialias)
+            screen.blit(surf, pos)
+            return surf.get_height()
+        x, y = pos
+        h = 0
+        for r in runs:
+            surf = self.get(r, size, color, bg_color, antialias)
+            screen.blit(surf, (x, y))
+            x += surf.get_width()
+            h = max(h, surf.get_height())
+        return h
+
+
 class BaseGame(metaclass=ABCMeta):
     """
     Base class for games
     """
     FPS_TRACKING_DEFAULT_SS = 13
 
-    def __init__(self, track_fps=True):
+    def __init__(self, track_fps=True, fixed_dt=None, max_steps=5):
+        """
+        fixed_dt (secs) turns on the fixed-timestep mode: update() always gets fixed_dt,
+        at most max_steps times per LOGICUPDATE, and render() gets an extra interpolation alpha
+        """
+        self._fixed_dt = fixed_dt
+        self._max_steps = max_steps
+        self._accumulator = 0.0
         if track_fps:
             self._fps_n_frames = self.FPS_TRACKING_DEFAULT_SS
         else:
@@ -26,8 +87,7 @@ class BaseGame(metaclass=ABCMeta):
         self._fps_tracker_rendering = collections.deque()
         self._tick = 0
 
-        self._cached_info_text = None
-        self._info_font = None
+        self._cached_info_text = TextCache()
 
     def start(self):
         """Starts the game loop. This method will not exit until the game has finished execution."""
@@ -42,9 +102,9 @@ class BaseGame(metaclass=ABCMeta):
 
             def proc_event(self, ev, source):
                 if ev.type == EngineEvTypes.LOGICUPDATE:
-                    self._game._update_internal(self._event_queue, ev.curr_t, ev.curr_t-self._last_update_time)
+                    if self._game._advance(self._event_queue, ev.curr_t, ev.curr_t-self._last_update_time):
+                        self._event_queue.clear()  # else keep the input for the next step
                     self._last_update_time = self._tnow_cache = ev.curr_t
-                    self._event_queue.clear()
                 if ev.type == EngineEvTypes.PAINT:
                     self._game._render_internal(ev.screen, self._tnow_cache)
                 else:
@@ -73,6 +133,7 @@ class BaseGame(metaclass=ABCMeta):
         pass
 
     def render(self, screen):
+        """in fixed-timestep mode, called as render(screen, alpha) with alpha in [0, 1)"""
         raise NotImplementedError()
 
     def update(self, events, dt):
@@ -104,15 +165,11 @@ class BaseGame(metaclass=ABCMeta):
     def is_running_in_web() -> bool:
         return kataen.runs_in_web()
 
-    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None):
-        if self._info_font is None or self._info_font.get_height() != size:
-            self._info_font = pygame.font.Font(None, size)
-        lines = text.split("\n")
+    def render_text(self, screen, text, size=12, pos=(0, 0), color=(255, 255, 255), bg_color=None,
+                    antialias=False, digit_runs=False):
         y = pos[1]
-        for lii in lines:
-            surf = self._info_font.render(lii, False, color, bg_color)
-            screen.blit(surf, (pos[0], y))
-            y += surf.get_height()
+        for lii in text.split("\n"):
+            y += self._cached_info_text.blit_line(screen, lii, size, (pos[0], y), color, bg_color, antialias, digit_runs)
 
     """
     private methods
@@ -133,7 +190,10 @@ class BaseGame(metaclass=ABCMeta):
             self._fps_tracker_rendering.append(tnow)
             if len(self._fps_tracker_rendering) > self._fps_n_frames:
                 self._fps_tracker_rendering.popleft()
-        self.render(screen)
+        if self._fixed_dt is None:
+            self.render(screen)
+        else:
+            self.render(screen, self._accumulator / self._fixed_dt)
 
     def _update_internal(self, events, tnow, dt):
         if self._fps_n_frames > 0:
@@ -143,3 +203,19 @@ class BaseGame(metaclass=ABCMeta):
         self.update(events, dt)
         self._tick += 1
 
+    def _advance(self, events, tnow, dt) -> int:
+        """runs the logic steps for dt elapsed secs, returns how many were run"""
+        if self._fixed_dt is None:
+            self._update_internal(events, tnow, dt)
+            return 1
+        self._accumulator += dt
+        steps = 0
+        while self._accumulator >= self._fixed_dt:
+            if steps == self._max_steps:  # too late to catch up, drop the backlog
+                self._accumulator %= self._fixed_dt
+                break
+            self._update_internal(events if steps == 0 else [], tnow, self._fixed_dt)
+            self._accumulator -= self._fixed_dt
+            steps += 1
+        return steps
+
@@ -5,6 +5,8 @@ from BaseGame import BaseGame
 from math import cos as cosinus
 from math import sin as sinus
 from math import radians as to_radians
+from math import hypot
+from array import array
 
 kataen = katasdk.engine
 pygame = kataen.import_pygame()
@@ -151,6 +153,7 @@ class RayCastWorld:
             self.grid.append([None] * grid_dims[1])
         self.cell_size = cell_size
         self.bg_color = bg_color
+        self._flat = None
 
     def randomize(self, chance=0.2, n_colors=5):
         colors = []
@@ -166,6 +169,30 @@ class RayCastWorld:
 
     def set_cell(self, xy, color):
         self.grid[xy[0]][xy[1]] = color
+        self._flat = None
+
+    def get_flat_cells(self):
+        """Returns (cells, palette), the grid flattened for batch casting.
+
+        cells[x * grid_h + y] is 0 for an empty cell, otherwise the index of
+        its color in palette (palette[0] is None). Rebuilt after set_cell().
+        """
+        if self._flat is None:
+            grid_w, grid_h = self.get_dims()
+            cells = array('H', bytes(2 * grid_w * grid_h))
+            palette = [None]
+            index = {}
+            for x, column in enumerate(self.grid):
+                base = x * grid_h
+                for y, color in enumerate(column):
+                    if color is not None:
+                        k = index.get(color)
+                        if k is None:
+                            k = index[color] = len(palette)
+                            palette.append(color)
+                        cells[base + y] = k
+            self._flat = (cells, palette)
+        return self._flat
 
     def get_cell(self, xy):
         return self.grid[xy[0]][xy[1]]
@@ -220,19 +247,111 @@ class RayState:
             return (self.end - self.start).length()
 
 
+class RayBatch:
+    """The state of all rays of a frame, stored column-wise in flat arrays.
+
+    For ray i: ray_x/ray_y is its direction, cells[i] its palette index (0 on
+    a miss), dists[i] the hit distance (inf on a miss) and hit_x/hit_y the hit
+    point, or the end of the ray at max depth on a miss.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.ray_x = array('d', bytes(8 * n))
+        self.ray_y = array('d', bytes(8 * n))
+        self.hit_x = array('d', bytes(8 * n))
+        self.hit_y = array('d', bytes(8 * n))
+        self.dists = array('d', bytes(8 * n))
+        self.cells = array('H', bytes(2 * n))
+        self.palette = [None]
+
+    def color(self, i):
+        return self.palette[self.cells[i]]
+
+
 class RayCastState:
 
-    def __init__(self, player: RayCastPlayer, world: RayCastWorld):
+    def __init__(self, player: RayCastPlayer, world: RayCastWorld, batch=False):
         self.player = player
         self.world = world
 
         self.ray_states = []
+        self.batch = batch
+        self.ray_batch = None
 
     def update_ray_states(self):
+        if self.batch:
+            rays = list(self.player.get_rays())
+            self.ray_batch = self.cast_rays(self.player.xy, rays, self.player.max_depth, self.ray_batch)
+            return
         self.ray_states.clear()
         for ray in self.player.get_rays():
             self.ray_states.append(self.cast_ray(self.player.xy, ray, self.player.max_depth))
 
+    def cast_rays(self, start_xy, rays, max_dist, out=None) -> RayBatch:
+        """Same walk as cast_ray, for all rays at once and without per-ray objects.
+
+        Works on the flat occupancy array of the world, results go in `out`
+        (reused when it has the right size).
+        """
+        cells, palette = self.world.get_flat_cells()
+        grid_w, grid_h = self.world.get_dims()
+        cell_size = self.world.cell_size
+        start_x, start_y = start_xy[0], start_xy[1]
+        start_tile_x, start_tile_y = int(start_x / cell_size), int(start_y / cell_size)
+        inf = float('inf')
+
+        n = len(rays)
+        if out is None or out.n != n:
+            out = RayBatch(n)
+        out.palette = palette
+        ray_xs, ray_ys, hit_xs, hit_ys = out.ray_x, out.ray_y, out.hit_x, out.hit_y
+        dists, hits = out.dists, out.cells
+
+        for i in range(n):
+            ray_x, ray_y = rays[i][0], rays[i][1]
+            ray_xs[i] = ray_x
+            ray_ys[i] = ray_y
+            max_x = start_x + ray_x * max_dist
+            max_y = start_y + ray_y * max_dist
+            cur_x, cur_y = start_x, start_y
+            hit = 0
+
+            if ray_x or ray_y:
+                dir_sign_x = 1 if ray_x > 0 else -1
+                dir_sign_y = 1 if ray_y > 0 else -1
+                tile_offset_x = 1 if ray_x > 0 else 0
+                tile_offset_y = 1 if ray_y > 0 else 0
+                tile_x, tile_y = start_tile_x, start_tile_y
+                t = 0
+                while ((0 <= tile_x < grid_w and 0 <= tile_y < grid_h)
+                       and (cur_x <= max_x if ray_x >= 0 else cur_x >= max_x)
+                       and (cur_y <= max_y if ray_y >= 0 else cur_y >= max_y)):
+                    hit = cells[tile_x * grid_h + tile_y]
+                    if hit:
+                        break
+
+                    dt_x = inf if ray_x == 0 else ((tile_x + tile_offset_x) * cell_size - cur_x) / ray_x
+                    dt_y = inf if ray_y == 0 else ((tile_y + tile_offset_y) * cell_size - cur_y) / ray_y
+                    if dt_x < dt_y:
+                        t += dt_x
+                        tile_x += dir_sign_x
+                    else:
+                        t += dt_y
+                        tile_y += dir_sign_y
+                    cur_x = start_x + ray_x * t
+                    cur_y = start_y + ray_y * t
+
+            hits[i] = hit
+            if hit:
+                hit_xs[i] = cur_x
+                hit_ys[i] = cur_y
+                dists[i] = hypot(cur_x - start_x, cur_y - start_y)
+            else:
+                hit_xs[i] = max_x
+                hit_ys[i] = max_y
+                dists[i] = inf
+        return out
+
     def cast_ray(self, start_xy, ray, max_dist) -> RayState:
         # yoinked from https://theshoemaker.de/2016/02/ray-casting-in-2d-grids/
         dir_sign_x = ray[0] > 0 and 1 or -1
@@ -318,16 +437,27 @@ class RayCastRenderer:
 
         bg_color = lerp_color(state.world.bg_color, (255, 255, 255), 0.05)
 
-        for r in state.ray_states:
-            color = r.color if r.color is not None else bg_color
-            if r.end is not None:
-                color = lerp_color(color, bg_color, r.dist() / state.player.max_depth)
-                pygame.draw.line(screen, color, r.start + cam_offs, r.end + cam_offs, 2)
-            else:
-                end_point = r.start
-                end_point += r.ray*state.player.max_depth
-                end_point += cam_offs
-                pygame.draw.line(screen, color, r.start + cam_offs, end_point, 2)
+        batch = state.ray_batch if state.batch else None
+        if batch is not None:
+            start = (p_xy[0] + cam_offs[0], p_xy[1] + cam_offs[1])
+            for i in range(batch.n):
+                k = batch.cells[i]
+                if k:
+                    color = lerp_color(batch.palette[k], bg_color, batch.dists[i] / state.player.max_depth)
+                else:
+                    color = bg_color
+                pygame.draw.line(screen, color, start, (batch.hit_x[i] + cam_offs[0], batch.hit_y[i] + cam_offs[1]), 2)
+        else:
+            for r in state.ray_states:
+                color = r.color if r.color is not None else bg_color
+                if r.end is not None:
+                    color = lerp_color(color, bg_color, r.dist() / state.player.max_depth)
+                    pygame.draw.line(screen, color, r.start + cam_offs, r.end + cam_offs, 2)
+                else:
+                    end_point = r.start
+                    end_point += r.ray*state.player.max_depth
+                    end_point += cam_offs
+                    pygame.draw.line(screen, color, r.start + cam_offs, end_point, 2)
 
         camera_rect = [p_xy[0] - screen_size[0] // 2, p_xy[1] - screen_size[1] // 2, screen_size[0], screen_size[1]]
 
@@ -354,7 +484,7 @@ class RayCasterGame(BaseGame):
                           direction,
                           60,
                           18, max_depth=175)
-        return RayCastState(p, w)
+        return RayCastState(p, w, batch=True)
 
     def get_mode(self):
         return 'SUPER_RETRO'
@@ -403,7 +533,7 @@ class RayCasterGame(BaseGame):
 
         if self.show_fps:
             fps_text = "FPS {:.1f}".format(self.get_fps(logical=False))
-            self.render_text(screen, fps_text, bg_color=(0, 0, 0), size=16)
+            self.render_text(screen, fps_text, bg_color=(0, 0, 0), size=16, digit_runs=True)
 
 
 # end of raycaster.py
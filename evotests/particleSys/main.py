@@ -3,6 +3,7 @@
 original code found in the project "Flyre" by CozyFractal
 """
 from game import Game
+import collections
 import math
 from math import cos, pi, sin
 from random import choice, gauss, randint, random, uniform
@@ -44,6 +45,10 @@ radians = pi / 180
 DEFAULT_FONT = None
 frame = 0
 
+# shapes understood by StampRenderer
+STAMP_DISC, STAMP_RING, STAMP_SQUARE = 1, 2, 3
+STAMP_ANGLE_STEP = 10  # rotation precision of polygon stamps, in degrees
+
 
 ##SNOW = pygame.image.fromstring(
 ##    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x841\xa2\xf2\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00\x00\x001\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf21\xa2\xf2\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00W\x84\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x001\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x001\xa2\xf2\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x001\xa2\xf2\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf21\xa2\xf2\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00W\x84\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x001\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00\x00\x001\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x841\xa2\xf2\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x841\xa2\xf2\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x841\xa2\xf2\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x001\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf21\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x841\xa2\xf2\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00W\x84\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00",
@@ -82,12 +87,110 @@ def rand2d(vec):
     return (uniform(0, vec[0]), uniform(0, vec[1]))
 
 
+class StampRenderer:
+    """
+    Batched drawing of circle, square and polygon particles.
+
+    Particles are bucketed by (shape, size, color) with the color and alpha rounded
+    to the nearest multiple of a few bits' step (0 and 255 stay exact). Each bucket is
+    rasterized once on a stamp surface kept in an LRU cache, then the whole frame goes
+    through Surface.blits(), in particle order: particles that can't be stamped or blitted
+    flush the sequence and draw() themselves.
+    """
+
+    def __init__(self, max_stamps=512, color_bits=5, alpha_bits=4):
+        self.max_stamps = max_stamps
+        self._color_q = self._rounding_table(color_bits)
+        self._alpha_q = self._rounding_table(alpha_bits)
+        self._stamps = collections.OrderedDict()
+        self._blit_seq = []
+
+    @staticmethod
+    def _rounding_table(bits):
+        """channel value -> nearest multiple of the bucket step, capped to 255"""
+        step = 0x100 >> bits
+        return bytes(min(255, (v + step // 2) // step * step) for v in range(256))
+
+    def stamp(self, key):
+        """Cached (surface, half width) for the bucket key."""
+        stamps = self._stamps
+        entry = stamps.get(key)
+        if entry is None:
+            entry = stamps[key] = self._rasterize(*key)
+            if len(stamps) > self.max_stamps:
+                stamps.popitem(last=False)
+        else:
+            stamps.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _rasterize(shape, size, r, g, b, a):
+        color = (r, g, b, a)
+        if shape == STAMP_SQUARE:
+            surf = pygame.Surface((size, size), pygame.SRCALPHA)
+            surf.fill(color)
+            return surf, size // 2
+
+        surf = pygame.Surface((2 * size + 1, 2 * size + 1), pygame.SRCALPHA)
+        if shape == STAMP_DISC:
+            pygame.draw.circle(surf, color, (size, size), size)
+        elif shape == STAMP_RING:
+            pygame.draw.circle(surf, color, (size, size), size, 1)
+        else:
+            _, vertices, vertex_step, rotation = shape
+            center = Vector2(size, size)
+            points = [
+                center + polar(size, rotation + i * 360 / vertices * vertex_step)
+                for i in range(vertices)
+            ]
+            pygame.draw.polygon(surf, color, points)
+        return surf, size
+
+    def draw(self, surf: pygame.Surface, particles):
+        color_q, alpha_q = self._color_q, self._alpha_q
+        stamp = self.stamp
+        seq = self._blit_seq
+        frame_stamps = dict()  # touch each LRU entry once per frame
+
+        for particle in particles:
+            shape = particle.stamp_shape()
+            if shape is None:
+                entry = particle.blit_entry()
+                if entry is not None:
+                    seq.append(entry)
+                else:
+                    surf.blits(seq, False)
+                    seq.clear()
+                    particle.draw(surf)
+                continue
+            r, g, b, a = particle.color
+            s = int(particle.size + 0.5)
+            if s <= 0 or not a:
+                continue
+            key = (shape, s, color_q[r], color_q[g], color_q[b], alpha_q[a])
+            entry = frame_stamps.get(key)
+            if entry is None:
+                entry = frame_stamps[key] = stamp(key)
+            img, half = entry
+            pos = particle.pos
+            seq.append((img, (int(pos.x) - half, int(pos.y) - half)))
+
+        surf.blits(seq, False)
+        seq.clear()
+
+
 class ParticleSystem(set):
     fountains: "List[ParticleFountain]"
 
-    def __init__(self):
+    def __init__(self, max_stamps=0):
+        """
+        Args:
+            max_stamps: when > 0, particles are drawn in one batch by a StampRenderer
+                caching at most that many stamps
+        """
         super().__init__()
         self.fountains = []
+        self.renderer = StampRenderer(max_stamps) if max_stamps else None
 
     def logic(self):
         """Update all the particle for the frame."""
@@ -106,6 +209,10 @@ class ParticleSystem(set):
     def draw(self, surf: pygame.Surface):
         """Draw all the particles"""
 
+        if self.renderer is not None:
+            self.renderer.draw(surf, self)
+            return
+
         for particle in self:
             particle.draw(surf)
 
@@ -125,10 +232,17 @@ class ParticleSystem(set):
 
 class ParticleFountain:
     def __init__(
-            self, particle_generator: Callable[[], "Particle"], frequency=1.0,
+            self, particle_generator: Callable[[], "Particle"], frequency=1.0, prewarm_images=(),
     ):
+        """
+        Args:
+            prewarm_images: surfaces used by the generated ImageParticle, all their
+                sizes are scaled right away instead of during the first frames
+        """
         self.generator = particle_generator
         self.frequency = frequency
+        for image in prewarm_images:
+            IMAGE_CACHE.prewarm(image)
 
     def logic(self, system):
         for _ in rrange(self.frequency):
@@ -339,6 +453,17 @@ class Particle:
     def draw(self, surf):
         raise NotImplementedError()
 
+    def stamp_shape(self):
+        """
+        Shape key used by StampRenderer, or None when the particle has to draw() itself.
+        Subclasses overriding draw() should override this as well.
+        """
+        return None
+
+    def blit_entry(self):
+        """(surface, topleft) for StampRenderer's blits() when stamp_shape() is None, or None to draw()"""
+        return None
+
 
 class DrawnParticle(Particle):
     def __init__(self, color=None):
@@ -407,6 +532,9 @@ class CircleParticle(DrawnParticle):
         else:
             pygame.draw.circle(surf, self.color, self.pos, self.size, 1 - self.filled)
 
+    def stamp_shape(self):
+        return STAMP_DISC if self.filled else STAMP_RING
+
 
 class SquareParticle(DrawnParticle):
     def draw(self, surf):
@@ -416,6 +544,9 @@ class SquareParticle(DrawnParticle):
         else:
             pygame.draw.rect(surf, self.color, (pos, (self.size, self.size)))
 
+    def stamp_shape(self):
+        return STAMP_SQUARE
+
 
 class PolygonParticle(DrawnParticle):
     def __init__(self, vertices: int, color=None, vertex_step: int = 1):
@@ -447,6 +578,11 @@ class PolygonParticle(DrawnParticle):
 
         gfxd.filled_polygon(surf, points, self.color)
 
+    def stamp_shape(self):
+        # a regular polygon looks the same every 360 / vertices degrees
+        rotation = STAMP_ANGLE_STEP * round(self.inner_rotation / STAMP_ANGLE_STEP)
+        return 'polygon', self.vertices, self.vertex_step, rotation % (360 / self.vertices)
+
 
 class ShardParticle(DrawnParticle):
     def __init__(self, color=None, head=1, tail=3):
@@ -488,12 +624,58 @@ class LineParticle(DrawnParticle):
         gfxd.line(surf, *start, *end, self.color)
 
 
+class ScaledImageCache:
+    """
+    Scaled copies of particle images, shared by all ImageParticle instances.
+
+    Entries are keyed by (source surface, integer size, alpha bucket) and the
+    least recently used one is dropped once max_entries is reached, so the
+    scaling cost is paid once per size instead of once per particle.
+    """
+
+    def __init__(self, max_entries=2048, alpha_bits=4):
+        self.max_entries = max_entries
+        self._alpha_low = 0xFF >> alpha_bits
+        self._entries = collections.OrderedDict()
+
+    def alpha_bucket(self, alpha: int) -> int:
+        """nearest multiple of the bucket step, clamped to 0..255 (same rounding as StampRenderer)"""
+        step = self._alpha_low + 1
+        return min(255, max(0, (int(alpha) + step // 2) // step * step))
+
+    def get(self, original: pygame.Surface, size: int, alpha: int = 255) -> pygame.Surface:
+        key = (original, size, self.alpha_bucket(alpha))
+        entries = self._entries
+        surf = entries.get(key)
+        if surf is not None:
+            entries.move_to_end(key)
+            return surf
+
+        w, h = original.get_size()
+        ratio = size / min(w, h)
+        surf = pygame.transform.scale(original, vec2int((w * ratio, h * ratio)))
+        surf.set_alpha(key[2])
+
+        entries[key] = surf
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return surf
+
+    def prewarm(self, original: pygame.Surface, alphas=None):
+        """Scale the image to every integer size up to its own, for each given alpha (default: every bucket)."""
+        if alphas is None:
+            alphas = list(range(0, 256, self._alpha_low + 1)) + [255]
+        for size in range(1, min(original.get_size()) + 1):
+            for alpha in alphas:
+                self.get(original, size, alpha)
+
+
 class ImageParticle(Particle):
     def __init__(self, surf: pygame.Surface):
         self._alpha = 255
         self.original_surf = surf
         self.need_redraw = True
-        self.surf = pygame.Surface((1, 1))
+        self.surf = None
 
         super().__init__()
 
@@ -505,25 +687,22 @@ class ImageParticle(Particle):
 
     @alpha.setter
     def alpha(self, value: int):
+        # scaled surfaces are shared, so a new alpha means picking another one
+        if IMAGE_CACHE.alpha_bucket(value) != IMAGE_CACHE.alpha_bucket(self._alpha):
+            self.need_redraw = True
         self._alpha = value
-        self.surf.set_alpha(value)
 
     def redraw(self):
         self.need_redraw = False
-        w, h = self.original_surf.get_size()
-        ratio = self.size / min(w, h)
-        surf = pygame.transform.scale(
-            self.original_surf, vec2int((w * ratio, h * ratio))
-        )
-
-        surf.set_alpha(self.alpha)
-        return surf
+        return IMAGE_CACHE.get(self.original_surf, int(self.size), self._alpha)
 
     def draw(self, surf: pygame.Surface):
+        surf.blit(*self.blit_entry())
+
+    def blit_entry(self):
         if self.need_redraw:
             self.surf = self.redraw()
-
-        surf.blit(self.surf, self.surf.get_rect(center=self.pos))
+        return self.surf, self.surf.get_rect(center=self.pos).topleft
 
     def logic(self):
         last_size = self.size
@@ -532,10 +711,14 @@ class ImageParticle(Particle):
             self.need_redraw = True
 
 
+IMAGE_CACHE = ScaledImageCache()
+
+
 class UniqueRecv(kataen.EventReceiver):
     def __init__(self):
         super().__init__()
         self.do_logic = True
+        self.img_fountain = None
         
     def proc_event(self, ev, source):
         global frame, particles, gctrl, DEFAULT_FONT, SCR_SIZE
@@ -554,6 +737,24 @@ class UniqueRecv(kataen.EventReceiver):
                 self.pev(kataen.EngineEvTypes.GAMEENDS)
             elif key == pygame.K_SPACE:
                 self.do_logic = not self.do_logic
+            elif key == pygame.K_i:
+                # toggles a fountain of text images, all their scaled copies are prewarmed
+                if self.img_fountain is None:
+                    surfs = [DEFAULT_FONT.render(text, True, "white") for text in ("Hello", "Bonjour", "Hola")]
+                    self.img_fountain = ParticleFountain(
+                        lambda: ImageParticle(choice(surfs)).builder()
+                        .at((SCR_SIZE[0] // 2, SCR_SIZE[1] // 2), gauss(270, 20))
+                        .velocity(gauss(3, 0.5))
+                        .living(90)
+                        .anim_fade()
+                        .build(),
+                        0.1,
+                        prewarm_images=surfs,
+                    )
+                if self.img_fountain in particles.fountains:
+                    particles.fountains.remove(self.img_fountain)
+                else:
+                    particles.fountains.append(self.img_fountain)
 
         elif ev.type == pygame.MOUSEBUTTONDOWN:
             for _ in range(96):
@@ -605,7 +806,7 @@ class MyGame(Game):
         SCR_SIZE = self.get_screen_size()
 
         # display = pygame.display.set_mode(SIZE, )
-        particles = ParticleSystem()
+        particles = ParticleSystem(max_stamps=512)
 
         # snow = SNOW
         # snow.set_colorkey((0, 0, 0))
@@ -26,11 +26,37 @@ MyEvTypes = kataen.event.enum_ev_types(
 
 SCR_SIZE = [0, 0]
 NB_ROCKS = 9
-bullets = list()
+bullets = list()  # [pos, speed, remaining ticks] lists
+BULLET_LIFETIME = 360  # ticks
+BULLET_MARGIN = 64  # px, bullets further off-screen are dropped
 FG_COLOR = (119, 255, 0)
 
 
 
+_asset_cache = dict()  # (path, flags) -> shared Surface/Sound
+
+
+def img_load(img_name, colorkey=None, convert=None):
+    """shared surface, loaded once per (path, flags); convert can be 'opaque' or 'alpha'.
+    Callers must not draw on the returned surface"""
+    key = (img_name, colorkey, convert)
+    if key not in _asset_cache:
+        surface = pygame.image.load(img_name)
+        if convert and pygame.display.get_surface():
+            surface = surface.convert_alpha() if convert == 'alpha' else surface.convert()
+        if colorkey is not None:
+            surface.set_colorkey(colorkey)
+        _asset_cache[key] = surface
+    return _asset_cache[key]
+
+
+def snd_load(path):
+    key = (path, 'snd')
+    if key not in _asset_cache:
+        _asset_cache[key] = pygame.mixer.Sound(path)
+    return _asset_cache[key]
+
+
 def deg(radvalue):
     return radvalue * (180 / math.pi)
 
@@ -43,10 +69,9 @@ class RockSprite(pygame.sprite.Sprite):
         if self.__class__.snd:
             pass
         else:
-            self.__class__.snd = pygame.mixer.Sound('assets/explosion_002.wav')
+            self.__class__.snd = snd_load('assets/explosion_002.wav')
             self.__class__.snd.set_volume(0.66)
-        self.image = pygame.image.load('assets/rock.png')
-        self.image.set_colorkey((0xff, 0, 0xff))
+        self.image = img_load('assets/rock.png', colorkey=(0xff, 0, 0xff), convert='alpha')
         pos = [random.randint(0, SCR_SIZE[0] - 1), random.randint(0, SCR_SIZE[1] - 1)]
         self.rect = self.image.get_rect()
         self.rect.topleft = pos
@@ -185,12 +210,43 @@ class ShipModel(kataen.event.CogObj):
         self._speed = Vector2()
 
 
+class SpatialHash:
+    """Uniform grid over the screen, cell coords wrap around like the game world (torus)"""
+
+    def __init__(self, size, cell_size=64):
+        self.cell_size = cell_size
+        self.cols = max(1, -(-size[0] // cell_size))
+        self.rows = max(1, -(-size[1] // cell_size))
+        self.cells = dict()
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert_point(self, x, y, item):
+        key = ((int(x) // self.cell_size) % self.cols, (int(y) // self.cell_size) % self.rows)
+        lst = self.cells.get(key)
+        if lst is None:
+            self.cells[key] = [item]
+        else:
+            lst.append(item)
+
+    def query_rect(self, rect):
+        """items in the cells touched by rect"""
+        cs = self.cell_size
+        for cx in range(rect.left // cs, (rect.right - 1) // cs + 1):
+            for cy in range(rect.top // cs, (rect.bottom - 1) // cs + 1):
+                lst = self.cells.get((cx % self.cols, cy % self.rows))
+                if lst:
+                    yield from lst
+
+
 class ShipCtrl(EventReceiver):
     def __init__(self, ref_mod, rocksm):
         super().__init__()
         self._ref_ship = ref_mod
         self._ref_rocks = rocksm
         self.last_tick = None
+        self._bullet_grid = SpatialHash(SCR_SIZE)
 
     def proc_event(self, ev, source):
         if ev.type == EngineEvTypes.LOGICUPDATE:
@@ -209,18 +265,31 @@ class ShipCtrl(EventReceiver):
                 tmp = 0
             self.last_tick = ev.curr_t
             self._ref_ship.update(tmp)
+            # bullets move, and expire after BULLET_LIFETIME ticks or once off-screen
+            alive = list()
             for b in bullets:
                 b[0].x += b[1].x
                 b[0].y += b[1].y
+                b[2] -= 1
+                if b[2] > 0 and (-BULLET_MARGIN <= b[0].x < SCR_SIZE[0] + BULLET_MARGIN
+                                 and -BULLET_MARGIN <= b[0].y < SCR_SIZE[1] + BULLET_MARGIN):
+                    alive.append(b)
+            bullets[:] = alive
+            grid = self._bullet_grid
+            grid.clear()
+            for idx, b in enumerate(bullets):
+                grid.insert_point(b[0].x, b[0].y, idx)
             remove = set()
             rb = set()
             for elt in self._ref_rocks:
-                for idx, b in enumerate(bullets):
-                    if elt.rect.collidepoint((b[0].x, b[0].y)):
-                        remove.add(elt)
-                        elt.zombie = True
-                        rb.add(idx)
-                        break
+                hit = None  # like before, the first bullet of the list that touches the rock
+                for idx in grid.query_rect(elt.rect):
+                    if (hit is None or idx < hit) and elt.rect.collidepoint((bullets[idx][0].x, bullets[idx][0].y)):
+                        hit = idx
+                if hit is not None:
+                    remove.add(elt)
+                    elt.zombie = True
+                    rb.add(hit)
                 if not elt.zombie and not elt.immunity:
                     if elt.rect.collidepoint(self._ref_ship.pos):
                         elt.inv_speed()
@@ -236,7 +305,7 @@ class ShipCtrl(EventReceiver):
                     del bullets[rbplus.pop()]
         elif ev.type == pygame.KEYDOWN:
             if ev.key == pygame.K_SPACE:
-                bullets.append(self._ref_ship.shoot())
+                bullets.append([*self._ref_ship.shoot(), BULLET_LIFETIME])
 
 
 class TinyWorldView(EventReceiver):
@@ -310,7 +379,7 @@ def print_mini_tutorial():
 class IntroV(EventReceiver):
     def __init__(self):
         super().__init__()
-        self.img = pygame.image.load('assets/enter_start.png')
+        self.img = img_load('assets/enter_start.png', convert='opaque')
         self.dim = self.img.get_size()
         self.painting = True
 
@@ -325,7 +394,7 @@ class IntroV(EventReceiver):
                 self.painting = False
                 print_mini_tutorial()
                 pygame.mixer.init()
-                music_snd = pygame.mixer.Sound('assets/ndimensions-zik.ogg')
+                music_snd = snd_load('assets/ndimensions-zik.ogg')
                 music_snd.set_volume(0.25)
                 music_snd.play(-1)
 
@@ -4,8 +4,10 @@ what remains of tetravalanche
 
 import json
 import random
+import socket
+import sys
 import time
-from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 import math
 import katagames_sdk as katasdk
 katasdk.bootstrap(0)
@@ -584,6 +586,94 @@ class MenuView:#(EventReceiver):
             bt.turn_off()
 
 
+class ServerCalls:
+    """
+    fait les appels serveur (GET + json.loads) sur un petit pool de threads, pour ne pas
+    bloquer la frame. Les callbacks sont appelés depuis le thread principal par dispatch(),
+    donc ils peuvent poster des évènements sans souci.
+    Deux requêtes de même clé en cours = une seule requête (coalescing)
+    Hors ctx web, serv.proxied_get tourne sur un thread du pool, avec un timeout socket par
+    défaut (socket.setdefaulttimeout, si personne n'en a mis): un serveur qui ne répond plus
+    libère quand même son thread. Dans le ctx web (pas de threads) l'appel reste bloquant
+    """
+    TIMEOUT = 10  # sec. avant d'abandonner une requête
+
+    def __init__(self, serv, max_workers=2, timeout=TIMEOUT):
+        self.serv = serv
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.threaded = sys.platform != 'emscripten'
+        self._pool = None
+        self._pending = dict()  # key -> [future, date de debut, liste de (callback, errback)]
+        if self.threaded and socket.getdefaulttimeout() is None:
+            socket.setdefaulttimeout(timeout)
+        self.start()
+
+    def start(self):
+        """(re)crée le pool si besoin, ex: retour dans le menu après un shutdown()"""
+        if self.threaded and self._pool is None:
+            try:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            except RuntimeError:  # pas de threads
+                self.threaded = False
+
+    def _get_json(self, url, params):
+        return json.loads(self.serv.proxied_get(url, params))
+
+    def request(self, key, url, params, callback, errback=None):
+        entry = self._pending.get(key)
+        if entry is not None:
+            entry[2].append((callback, errback))
+            return
+        fut = None
+        if self.threaded:
+            self.start()
+            try:
+                fut = self._pool.submit(self._get_json, url, params)
+            except RuntimeError as e:  # ex: interpréteur en train de s'arrêter
+                print('ServerCalls: {}, appel bloquant pour {}'.format(e, key))
+        if fut is None:  # repli: appel bloquant, résultat quand même livré par dispatch()
+            fut = Future()
+            try:
+                fut.set_result(self._get_json(url, params))
+            except Exception as e:
+                fut.set_exception(e)
+        self._pending[key] = [fut, time.time(), [(callback, errback)]]
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def dispatch(self):
+        """à appeler à chaque LOGICUPDATE"""
+        if not self._pending:
+            return
+        now = time.time()
+        for key, (fut, t_debut, callbacks) in list(self._pending.items()):
+            if fut.done():
+                del self._pending[key]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    for _, errback in callbacks:
+                        if errback is not None:
+                            errback(e)
+                else:
+                    for callback, _ in callbacks:
+                        callback(res)
+            elif now - t_debut > self.timeout:
+                del self._pending[key]
+                fut.cancel()
+                for _, errback in callbacks:
+                    if errback is not None:
+                        errback(TimeoutError('{} took more than {} sec.'.format(key, self.timeout)))
+
+    def shutdown(self):
+        self._pending.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None  # start() en refait un
+
+
 class MenuCtrl(EventReceiver):
     """
     possède un attribut
@@ -608,6 +698,7 @@ class MenuCtrl(EventReceiver):
         self.polling_mode = True
 
         self.serv = kengi.network.HttpServer.instance()
+        self.calls = ServerCalls(self.serv)
 
     def pause_polling(self):
         self.polling_mode = False
@@ -616,13 +707,13 @@ class MenuCtrl(EventReceiver):
         self.polling_mode = True
 
     def __handlelogic(self, ev):
+        self.calls.dispatch()
         if self.nextmode_buffer is None:
             if is_user_logged():
                 if self.polling_mode:
                     if (self.last_pol is None) or (ev.curr_t - self.last_pol > self.POLLING_FREQ):
                         self.last_pol = ev.curr_t
-                        nouv_solde = self._recup_solde_serveur()
-                        set_solde(nouv_solde)
+                        self._demande_solde()
 
         else:  # -----------------------------------------------
             if glvars_is_sfx_playin():
@@ -643,8 +734,11 @@ class MenuCtrl(EventReceiver):
 
     def _procedure_debut_challenge(self):
         """
-        :return: bool disant si oui ou non, la procédure s'est déroulé correctement
+        lance les deux appels serveur (n° de tournoi + seed, puis paiement), sans bloquer.
+        Si tout se passe bien on passe à l'état Tetris
         """
+        if self.calls.is_pending('play_it') or self.calls.is_pending('pay_due'):
+            return
         if glvars.DEV_MODE:
             print('DEBUG:  _procedure_debut_challenge')
         # - on récupère n° seed et de tournoi
@@ -653,25 +747,35 @@ class MenuCtrl(EventReceiver):
             'fct': 'play_it',
             'game_id': str(glvars.GAME_ID)  # identifie le jeu ds le système du ludo.store
         }
-        res = self.serv.proxied_get(target, params)
-        tmp = json.loads(res)
+
+        def paiement_ok(tmp):
+            if tmp:
+                self.pev(EngineEvTypes.PUSHSTATE, state_ident=GameStates.Tetris)
+
+        def tournoi_recu(tmp):
+            if glvars.DEV_MODE:
+                print('DEBUG:  appel sur tournois.php donne...')
+                print(str(tmp))
+            glvars.num_challenge = int(tmp[0])
+            glvars.chall_seed = int(tmp[1])
+            # - on paye le droit d'entrée et c'est parti
+            params_paiement = {
+                'fct': 'pay_due',
+                'price': str(MenuModel.COUT_PARTIE),
+                'cid': str(glvars.num_challenge),
+                'id_perso': str(glvars.acc_id)
+            }
+            self.calls.request('pay_due', target, params_paiement, paiement_ok, self._echec_appel)
+
+        self.calls.request('play_it', target, params, tournoi_recu, self._echec_appel)
+
+    @staticmethod
+    def _echec_appel(err):
         if glvars.DEV_MODE:
-            print('DEBUG:  appel sur tournois.php donne...')
-            print(str(tmp))
-        glvars.num_challenge = int(tmp[0])
-        glvars.chall_seed = int(tmp[1])
-        # - on paye le droit d'entrée et c'est parti
-        params = {
-            'fct': 'pay_due',
-            'price': str(MenuModel.COUT_PARTIE),
-            'cid': str(glvars.num_challenge),
-            'id_perso': str(glvars.acc_id)
-        }
-        res = self.serv.proxied_get(target, params)
-        tmp = json.loads(res)
-        return tmp
+            print('DEBUG:  appel serveur en echec', err)
 
-    def _recup_solde_serveur(self):
+    def _demande_solde(self):
+        """demande le solde sans bloquer, il arrive via set_solde -> BalanceChanges"""
         if glvars.DEV_MODE:
             print('envoi serveur...')
         target = self.serv.get_gtm_app_url() + 'maj_solde.php'
@@ -679,11 +783,14 @@ class MenuCtrl(EventReceiver):
             'id_perso': glvars.acc_id,
             'updating': 0
         }
-        res = self.serv.proxied_get(target, params)
-        tmp = json.loads(res)
-        if tmp is None:
-            raise Exception('cannot retrieve players balance!')
-        return int(tmp)
+
+        def solde_recu(tmp):
+            if tmp is None:
+                self._echec_appel('cannot retrieve players balance!')
+            else:
+                set_solde(int(tmp))
+
+        self.calls.request('solde', target, params, solde_recu, self._echec_appel)
 
     def impacte_retour_login(self):
         if glvars.username:
@@ -704,8 +811,8 @@ class MenuCtrl(EventReceiver):
             self.__handlelogic(ev)
 
         elif ev.type == MyEvTypes.DemandeTournoi:
-            if self.ref_mod.can_bet() and self._procedure_debut_challenge():
-                self.pev(EngineEvTypes.PUSHSTATE, state_ident=GameStates.Tetris)
+            if self.ref_mod.can_bet():
+                self._procedure_debut_challenge()
 
         elif ev.type == pygame.KEYDOWN:
             if ev.key == pygame.K_UP:
@@ -734,6 +841,7 @@ class MenuState(BaseGameState):
         if self.c is None:
             self.c = MenuCtrl(self.m, self.v)
             self.c.impacte_retour_login()
+        self.c.calls.start()
         self.c.turn_on()
         glvars_init_sound()
 
@@ -748,6 +856,7 @@ class MenuState(BaseGameState):
 
     def release(self):
         self.c.turn_off()
+        self.c.calls.shutdown()
         self.v.turn_off()
         pygame.mixer.music.fadeout(750)
         while pygame.mixer.music.get_busy():
@@ -771,6 +880,10 @@ class TetColor:
     CYAN = "cyan"
     ORANGE = "orange"
 
+    # small-int codes used by the Board storage, CLEAR is 0
+    ALL = (CLEAR, RED, BLUE, GREEN, YELLOW, MAGENTA, CYAN, ORANGE)
+    CODES = {c: i for i, c in enumerate(ALL)}
+
     @staticmethod
     def colors():
         return (
@@ -828,19 +941,29 @@ class Piece:
         self.x += x
         self.y += y
 
+    @staticmethod
+    def build_tables(shape):
+        """Adds to a shape dict its tile offsets for each rotation, and their row-mask form:
+        (min x offset, max x offset, max y offset, ((y offset, bitmask of x offsets), ...))"""
+        tiles, x_adj, y_adj = shape["tiles"], shape["x_adj"], shape["y_adj"]
+        shape["rotations"] = (
+            tuple(tiles),
+            tuple((y_adj - y_offset, x_offset) for x_offset, y_offset in tiles),
+            tuple((x_adj - x_offset, y_adj - y_offset) for x_offset, y_offset in tiles),
+            tuple((y_offset, x_adj - x_offset) for x_offset, y_offset in tiles)
+        )
+        masks = []
+        for offsets in shape["rotations"]:
+            row_masks = dict()
+            for dx, dy in offsets:
+                row_masks[dy] = row_masks.get(dy, 0) | (1 << dx)
+            masks.append((min(dx for dx, _ in offsets), max(dx for dx, _ in offsets),
+                          max(dy for _, dy in offsets), tuple(sorted(row_masks.items()))))
+        shape["masks"] = tuple(masks)
+
     def __iter__(self):
-        for x_offset, y_offset in self.shape["tiles"]:
-            if self.rotation == 0:
-                yield self.x + x_offset, self.y + y_offset
-            elif self.rotation == 1:
-                yield (self.x - y_offset + self.shape["y_adj"],
-                       self.y + x_offset)
-            elif self.rotation == 2:
-                yield (self.x - x_offset + self.shape["x_adj"],
-                       self.y - y_offset + self.shape["y_adj"])
-            elif self.rotation == 3:
-                yield (self.x + y_offset,
-                       self.y - x_offset + self.shape["x_adj"])
+        for x_offset, y_offset in self.shape["rotations"][self.rotation]:
+            yield self.x + x_offset, self.y + y_offset
 
     def render(self, v):
         for x, y in self:
@@ -858,92 +981,178 @@ class Piece:
         return p
 
 
+for _shape in Piece.SHAPES:
+    Piece.build_tables(_shape)
+
+
 class Board:#(kengi.event.CogObj):
     def __init__(self, n_columns, n_rows, autogen=True):
         super().__init__()
         self.height = n_rows
         self.width = n_columns
         self.columns = [self.height] * n_columns
+        self.full_row = (1 << n_columns) - 1
         self.rand = random.Random()
         self.autogen = autogen
         self.level = self.piece = self.finalize_ready = None
-        self.tiles = self.score = self.lines = self.game_over = None
+        self.rows = self.colors = self.score = self.lines = self.game_over = None
         self.quake_effect = False
         self.reset()
 
     def reset(self):
         self.piece = None
         self.finalize_ready = False
-        self.tiles = defaultdict(lambda: TetColor.CLEAR)
+        # one bitmask per row (bit x set <=> tile at x is filled) + one TetColor code per cell
+        self.rows = [0] * self.height
+        self.colors = bytearray(self.width * self.height)
+        # cells changed since the last met_a_jour_vue, same layout as rows
+        self.dirty = [self.full_row] * self.height
+        self.quake_plan = None
+        self._shown_piece = []
         self.score = 0
         self.level = 1
         self.lines = 0
         self.game_over = False
 
+    @property
+    def tiles(self):
+        """Filled tiles, as a {(x, y): color} dict"""
+        return {(x, y): TetColor.ALL[self.colors[y * self.width + x]] for x, y in self.filled_tiles()}
+
+    def filled_tiles(self):
+        for y, row in enumerate(self.rows):
+            x = 0
+            while row:
+                if row & 1:
+                    yield x, y
+                row >>= 1
+                x += 1
+
+    def get_tile_color(self, x, y):
+        if self.is_tile_empty(x, y):
+            return TetColor.CLEAR
+        return TetColor.ALL[self.colors[y * self.width + x]]
+
     def more_quake(self):
-        tomba = False
-        for y in range(self.height - 2, -1, -1):
-            for x in range(0, self.width + 1):
-                if not self.is_tile_empty(x, y):
-                    c = self.tiles[(x, y)]
-                    if self.is_tile_empty(x, y + 1):
-                        self.set_tile_color(x, y, TetColor.CLEAR)
-                        self.set_tile_color(x, y + 1, c)
-                        tomba = True
-            if tomba:
-                self.pev(MyEvTypes.BlocksCrumble)
-                return
-        if not tomba:
+        """One tick of the crumble effect: every floating tile falls one cell"""
+        if self.quake_plan is None:
+            self.quake_plan = self.plan_quake()
+            self.quake_plan.reverse()  # pop() gives the ticks in order
+        if not self.quake_plan:
+            self.quake_plan = None
             self.pev(MyEvTypes.FlatWorld)
             self.accu_score()
+            return
+        rows, colors, dirty, w = self.rows, self.colors, self.dirty, self.width
+        for y, falling in self.quake_plan.pop():  # lowest rows first
+            rows[y] &= ~falling
+            rows[y + 1] |= falling
+            dirty[y] |= falling
+            dirty[y + 1] |= falling
+            x = 0
+            while falling:
+                if falling & 1:
+                    colors[(y + 1) * w + x] = colors[y * w + x]
+                    colors[y * w + x] = 0
+                falling >>= 1
+                x += 1
+        self.pev(MyEvTypes.BlocksCrumble)
+
+    def plan_quake(self):
+        """Settles every column at once, gives the fall steps: one [(row, falling mask), ...] list per tick
+
+        Tiles keep their order in a column and end up stacked from the bottom, a tile that has
+        to fall d cells moves at each of the first d ticks.
+        """
+        h = self.height
+        rows = self.rows
+        if not any(rows[y] & ~rows[y + 1] for y in range(h - 1)):
+            return []  # already flat
+        moves = []  # moves[t][y]: tiles going from row y to y + 1 at tick t
+        for x in range(self.width):
+            bit = 1 << x
+            free = h - 1
+            for y in range(h - 1, self.columns[x] - 1, -1):  # no tile above the column top
+                if rows[y] & bit:
+                    for t in range(free - y):
+                        while len(moves) <= t:
+                            moves.append([0] * h)
+                        moves[t][y + t] |= bit
+                    free -= 1
+        return [[(y, m[y]) for y in range(h - 2, -1, -1) if m[y]] for m in moves]
 
     def clear_tile(self, x, y):
-        self.tiles[(x, y)] = TetColor.CLEAR
-        # Move all the tiles above this row down one space
-        for y_tile in range(y, self.columns[x] - 1, -1):
-            self.tiles[(x, y_tile)] = self.tiles[(x, y_tile - 1)]
+        bit = 1 << x
+        rows, colors, w = self.rows, self.colors, self.width
+        self.quake_plan = None
+        rows[y] &= ~bit
+        colors[y * w + x] = 0
+        # Move all the tiles above this one down one space
+        for y_tile in range(y, max(self.columns[x], 1) - 1, -1):
+            if rows[y_tile - 1] & bit:
+                rows[y_tile] |= bit
+                colors[y_tile * w + x] = colors[(y_tile - 1) * w + x]
+            else:
+                rows[y_tile] &= ~bit
+                colors[y_tile * w + x] = 0
+        if self.columns[x] == 0:
+            rows[0] &= ~bit
+            colors[x] = 0
+        for y_tile in range(y + 1):
+            self.dirty[y_tile] |= bit
         # And reset the top of of the columns
-        while (self.columns[x] < self.height and
-               self.tiles[(x, self.columns[x])] == TetColor.CLEAR):
+        while self.columns[x] < self.height and not rows[self.columns[x]] & bit:
             self.columns[x] += 1
 
     def clear_row(self, row):
-        for col in range(len(self.columns)):
-            self.clear_tile(col, row)
+        # tiles above the columns tops are always clear, so this is every column going down one space
+        w = self.width
+        self.quake_plan = None
+        del self.rows[row]
+        self.rows.insert(0, 0)
+        self.colors[w:(row + 1) * w] = self.colors[:row * w]
+        self.colors[:w] = bytes(w)
+        self.dirty[:row + 1] = [self.full_row] * (row + 1)
+        for x in range(w):
+            while self.columns[x] < self.height and not self.rows[self.columns[x]] >> x & 1:
+                self.columns[x] += 1
 
     def row_full(self, row):
-        for col in range(len(self.columns)):
-            if self.tiles[(col, row)] == TetColor.CLEAR:
-                return False
-        return True
+        return 0 <= row < self.height and self.rows[row] == self.full_row
 
     def set_tile_color(self, x, y, color):
         # assert color != TetColor.CLEAR
-        self.tiles[(x, y)] = color
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        bit = 1 << x
+        self.dirty[y] |= bit
+        self.quake_plan = None
         if color == TetColor.CLEAR:
+            self.rows[y] &= ~bit
+            self.colors[y * self.width + x] = 0
             return
+        self.rows[y] |= bit
+        self.colors[y * self.width + x] = TetColor.CODES[color]
         if self.columns[x] > y:
             self.columns[x] = y
 
     def is_tile_empty(self, x, y):
-        return self.tiles[(x, y)] == TetColor.CLEAR
+        return not (0 <= x < self.width and 0 <= y < self.height and self.rows[y] >> x & 1)
 
     def piece_can_move(self, x_move, y_move):
         """Returns True if a piece can move, False otherwise."""
         assert self.piece is not None
-        # for base_x, base_y in self.piece:
-        #     x = x_move + base_x
-        #     y = y_move + base_y
-        #     if not 0 <= x < len(self.columns) or y >= self.columns[x]:
-        #         return False
-        for basex, basey in self.piece:
-            x = basex + x_move
-            y = basey + y_move
-            if not (0 <= x < len(self.columns)):
-                return False
-            if y >= self.height:
-                return False
-            if not self.is_tile_empty(x, y):
+        p = self.piece
+        return self.piece_fits(p.x + x_move, p.y + y_move, p.rotation)
+
+    def piece_fits(self, x, y, rotation):
+        """Tells if the current piece, put at (x, y) with the given rotation, would be on free cells"""
+        min_dx, max_dx, max_dy, row_masks = self.piece.shape["masks"][rotation]
+        if x + min_dx < 0 or x + max_dx >= self.width or y + max_dy >= self.height:
+            return False
+        rows = self.rows
+        for dy, mask in row_masks:
+            if y + dy >= 0 and rows[y + dy] & (mask << x):
                 return False
         return True
 
@@ -964,11 +1173,24 @@ class Board:#(kengi.event.CogObj):
     def full_drop_piece(self):
         """Either drops a piece down one level, or finalizes it and creates another piece."""
         if self.piece is not None:
-            while self.piece_can_move(0, 1):
-                self.piece.move(0, 1)
+            self.piece.move(0, self.drop_distance())
             self.finalize_piece()
             self.generate_piece()
 
+    def drop_distance(self):
+        """How many rows the current piece can fall"""
+        p, rows, h = self.piece, self.rows, self.height
+        if not self.piece_fits(p.x, p.y + 1, p.rotation):
+            return 0
+        dist = h
+        for dx, dy in p.shape["rotations"][p.rotation]:
+            bit = 1 << (p.x + dx)
+            y = p.y + dy + 1
+            while y < h and not rows[y] & bit:
+                y += 1
+            dist = min(dist, y - (p.y + dy) - 1)
+        return dist
+
     def move_piece(self, x_move, y_move):
         """Move a piece some number of spaces in any direction"""
         if self.piece is not None:
@@ -983,9 +1205,11 @@ class Board:#(kengi.event.CogObj):
 
     def piece_can_rotate(self, clockwise):
         """Returns True if a piece can drop, False otherwise."""
-        p = self.piece.rotated(clockwise)
-        for x, y in p:
-            if not 0 <= x < len(self.columns) or y >= self.columns[x]:
+        p = self.piece
+        rotation = (p.rotation + (1 if clockwise else -1)) % 4
+        for dx, dy in p.shape["rotations"][rotation]:
+            x = p.x + dx
+            if not 0 <= x < len(self.columns) or p.y + dy >= self.columns[x]:
                 return False
         return True
 
@@ -1027,12 +1251,31 @@ class Board:#(kengi.event.CogObj):
         self.piece = None
 
     def met_a_jour_vue(self, v):
-        v.clear()
-        v.set_size(len(self.columns), self.height)
-        for (x, y), color in self.tiles.items():
-            v.render_tile(x, y, color)
+        """Sends the view the cells changed since the previous call"""
+        if v.width != self.width or v.height != self.height:
+            v.set_size(self.width, self.height)
+            self.dirty = [self.full_row] * self.height
+        dirty, w = self.dirty, self.width
+        # the piece is not in rows, so where it was and where it is are dirty too
+        piece = [] if self.piece is None else [(x, y) for x, y in self.piece if 0 <= x < w and 0 <= y < self.height]
+        for x, y in self._shown_piece:
+            dirty[y] |= 1 << x
+        for x, y in piece:
+            dirty[y] |= 1 << x
+        self._shown_piece = piece
+        for y, mask in enumerate(dirty):
+            if not mask:
+                continue
+            dirty[y] = 0
+            x = 0
+            while mask:
+                if mask & 1:
+                    v.render_tile(x, y, TetColor.ALL[self.colors[y * w + x]])
+                mask >>= 1
+                x += 1
         if self.piece is not None:
-            self.piece.render(v)
+            for x, y in piece:
+                v.render_tile(x, y, self.piece.color)
         v.set_score(self.score)
         v.set_level(self.level)
 
@@ -1217,6 +1460,11 @@ class TetrisView(EventReceiver):
         self.level = None
         self.__fond_gameover = None
         self.__label_gameover = None
+        # persistent board surface, only the cells listed in dirty_cells get redrawn
+        self.board_surf = None
+        self.dirty_cells = []
+        self.stamps = dict()  # TetColor -> box_size x box_size surface
+        self._score_cache = self._level_cache = (None, None)
 
         # sons
         self.sfx_explo = pygame.mixer.Sound(ASSET_ALIASES['explo'])
@@ -1224,10 +1472,13 @@ class TetrisView(EventReceiver):
 
     def clear(self):
         self.rows = [[TetColor.CLEAR] * self.width for _ in range(self.height)]
+        self.board_surf = None
 
     def render_tile(self, x, y, color):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.rows[y][x] = color
+            if self.rows[y][x] != color:
+                self.rows[y][x] = color
+                self.dirty_cells.append((x, y))
 
     # Public interface to views
     def set_size(self, cols, rows):
@@ -1250,11 +1501,15 @@ class TetrisView(EventReceiver):
     def show_score(self, ecran):
         score_height = 0
         if self.score is not None:
-            score_surf = self.sc_font.render("{:06d}".format(self.score), True, self.font_color)
+            if self._score_cache[0] != self.score:
+                self._score_cache = (self.score, self.sc_font.render("{:06d}".format(self.score), True, self.font_color))
+            score_surf = self._score_cache[1]
             ecran.blit(score_surf, (self.BOARD_BORDER_SIZE, self.BOARD_BORDER_SIZE))
             score_height = score_surf.get_height()
         if self.level is not None:
-            level_surf = self.sc_font.render("Niveau {:02d}".format(self.level), True, self.font_color)
+            if self._level_cache[0] != self.level:
+                self._level_cache = (self.level, self.sc_font.render("Niveau {:02d}".format(self.level), True, self.font_color))
+            level_surf = self._level_cache[1]
             level_pos = (self.BOARD_BORDER_SIZE,
                          self.BOARD_BORDER_SIZE + score_height + self.SCORE_PADDING)
             ecran.blit(level_surf, level_pos)
@@ -1299,6 +1554,8 @@ class TetrisView(EventReceiver):
                                 - self.BOARD_BORDER_SIZE
                                 - (self.width * vert_size)))
             self.padding = (left_padding, 0)
+        self.board_surf = None
+        self.stamps.clear()
         global _print_dim
         if _print_dim:
             print(self.width, self.height)
@@ -1309,18 +1566,27 @@ class TetrisView(EventReceiver):
             _print_dim = True
 
     def draw_board(self, ecran):
-        board_color = self.COLOR_MAP[TetColor.CLEAR]
         x_start = self.BOARD_BORDER_SIZE + (self.padding[1] // 2)
         y_start = self.BOARD_BORDER_SIZE + (self.padding[0] // 2)
-        x, y = x_start, y_start
-        board_rect = (y, x, self.width * self.box_size, self.height * self.box_size)
-        pygame.draw.rect(ecran, board_color, board_rect)
-        for col in self.rows:
-            for item in col:
-                self.draw_box(ecran, x, y, item)
-                y += self.box_size
-            x += self.box_size
-            y = y_start
+        box = self.box_size
+        if self.board_surf is None:
+            self.board_surf = pygame.Surface((self.width * box, self.height * box))
+            self.board_surf.fill(self.COLOR_MAP[TetColor.CLEAR])
+            self.dirty_cells = [(x, y) for y, row in enumerate(self.rows) for x, c in enumerate(row) if c != TetColor.CLEAR]
+        if self.dirty_cells:
+            self.board_surf.blits([(self.get_stamp(self.rows[y][x]), (x * box, y * box)) for x, y in self.dirty_cells], False)
+            self.dirty_cells.clear()
+        ecran.blit(self.board_surf, (y_start, x_start))
+
+    def get_stamp(self, color):
+        stamp = self.stamps.get(color)
+        if stamp is None:
+            stamp = self.stamps[color] = pygame.Surface((self.box_size, self.box_size))
+            if color == TetColor.CLEAR:
+                stamp.fill(self.COLOR_MAP[TetColor.CLEAR])
+            else:
+                self.draw_box(stamp, 0, 0, color)
+        return stamp
 
     def draw_box(self, ecran, x, y, color):
         if color == TetColor.CLEAR:
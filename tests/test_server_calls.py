@@ -0,0 +1,138 @@
+"""
+ServerCalls (tetris menu) against a local stub server
+
+The game scripts need katagames_sdk to be imported, so only the ServerCalls class
+source is extracted and run here.
+
+    python -m unittest discover tests
+"""
+import ast
+import http.server
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ('tag008/simple-demo/main.py', 'tag009/tetrav-essai.py')
+
+
+def load_server_calls(script):
+    with open(os.path.join(ROOT, script), encoding='utf-8') as fp:
+        src = fp.read()
+    node = next(n for n in ast.parse(src).body if isinstance(n, ast.ClassDef) and n.name == 'ServerCalls')
+    ns = {
+        'json': json, 'socket': socket, 'sys': sys, 'time': time,
+        'Future': Future, 'ThreadPoolExecutor': ThreadPoolExecutor,
+    }
+    exec(ast.get_source_segment(src, node), ns)
+    return ns['ServerCalls']
+
+
+class StubServ:
+    """stands for kengi.network.HttpServer: a GET without any explicit timeout"""
+
+    @staticmethod
+    def proxied_get(url, params):
+        with urllib.request.urlopen(url + '?' + urllib.parse.urlencode(params)) as resp:
+            return resp.read().decode('utf-8')
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """answers ?delay=<secs> requests with a json list, after sleeping"""
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        time.sleep(float(query.get('delay', ['0'])[0]))
+        try:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps([7, 42]).encode())
+        except OSError:  # client gave up
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class ServerCallsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}/tournois.php'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        socket.setdefaulttimeout(None)  # ServerCalls sets it once per process
+
+    def tearDown(self):
+        socket.setdefaulttimeout(None)
+
+    def run_until_done(self, calls, max_secs):
+        t0 = time.time()
+        while calls._pending and time.time() - t0 < max_secs:
+            calls.dispatch()
+            time.sleep(0.01)
+        self.assertFalse(calls._pending)
+
+    def each_script(self):
+        for script in SCRIPTS:
+            with self.subTest(script=script):
+                yield load_server_calls(script)
+
+    def test_result_coalesced(self):
+        for cls in self.each_script():
+            calls = cls(StubServ(), timeout=2)
+            got = []
+            calls.request('solde', self.url, {'delay': 0.1}, got.append)
+            calls.request('solde', self.url, {'delay': 0.1}, got.append)
+            self.run_until_done(calls, 2)
+            self.assertEqual(got, [[7, 42], [7, 42]])
+            calls.shutdown()
+
+    def test_hung_requests_free_the_pool(self):
+        for cls in self.each_script():
+            calls = cls(StubServ(), max_workers=2, timeout=0.3)
+            errors, got = [], []
+            for k in range(2):
+                calls.request('hung{}'.format(k), self.url, {'delay': 3}, got.append, errors.append)
+            self.run_until_done(calls, 2)
+            self.assertEqual(len(errors), 2)
+            # both workers gave up thanks to the socket timeout, a new call goes through
+            time.sleep(0.3)
+            t0 = time.time()
+            calls.request('solde', self.url, {'delay': 0}, got.append, errors.append)
+            self.run_until_done(calls, 2)
+            self.assertEqual(got, [[7, 42]])
+            self.assertLess(time.time() - t0, 0.3)
+            calls.shutdown()
+
+    def test_restart_after_shutdown(self):
+        for cls in self.each_script():
+            calls = cls(StubServ(), timeout=2)
+            calls.shutdown()
+            calls.start()
+            got = []
+            t0 = time.time()
+            calls.request('solde', self.url, {'delay': 0.5}, got.append)
+            self.assertLess(time.time() - t0, 0.2)  # not a blocking call
+            self.run_until_done(calls, 2)
+            self.assertEqual(got, [[7, 42]])
+            calls.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()